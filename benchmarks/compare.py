@@ -0,0 +1,49 @@
+"""
+Compare two result files from benchmarks/suite.py.
+
+    python benchmarks/compare.py base.json new.json [--threshold 0.1]
+
+Prints the ratio new / base of the median time of every benchmark present in both runs,
+flagging those slower or faster by more than the threshold.
+"""
+import argparse
+import json
+
+
+def load(path):
+    with open(path) as f:
+        run = json.load(f)
+    return {(entry["group"], entry["name"]): entry for entry in run["results"] if "skipped" not in entry}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change to flag (0.1 = 10%%).")
+    args = parser.parse_args()
+
+    base = load(args.base)
+    new = load(args.new)
+    slower = faster = 0
+    for key in base:
+        if key not in new:
+            continue
+        ratio = new[key]["median"] / base[key]["median"]
+        flag = ""
+        if ratio > 1 + args.threshold:
+            flag = "SLOWER"
+            slower += 1
+        elif ratio < 1 - args.threshold:
+            flag = "faster"
+            faster += 1
+        group, name = key
+        print(f"{group:14s} {name:48s} {base[key]['median'] * 1e6:12.1f} -> {new[key]['median'] * 1e6:12.1f} us"
+              f"  x{ratio:5.2f} {flag}")
+    only_base = sorted(set(base) - set(new))
+    only_new = sorted(set(new) - set(base))
+    for group, name in only_base:
+        print(f"{group:14s} {name:48s} only in {args.base}")
+    for group, name in only_new:
+        print(f"{group:14s} {name:48s} only in {args.new}")
+    print(f"{slower} slower, {faster} faster (threshold {args.threshold:.0%})")
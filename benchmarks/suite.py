@@ -0,0 +1,330 @@
+"""
+Benchmarks for the serialization and RPC stack, runnable without a display (Agg backend, stand-in services).
+
+    python benchmarks/suite.py [--quick] [--only serialization,rpc,startup,spin,matplotlib] [--output results.json]
+    python benchmarks/compare.py base.json new.json
+
+Every result records the median and minimum seconds per operation over several repeats,
+plus bytes per second where a payload size makes sense. Missing optional libraries
+(torch, PIL) are reported as skipped.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+# Children inherit the environment, so every matplotlib process in the suite is headless.
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import numpy as np
+import rpyc
+from rpyc.core import brine
+
+import plot_wrapper
+from plot_wrapper import ServiceHost, WrapperService, AsyncWrapperService, WarmPool
+from plot_wrapper._plot_wrapper import TRANSPORTS
+
+GROUPS = ("serialization", "rpc", "startup", "spin", "matplotlib")
+
+
+def measure(func, min_time=0.05, repeat=5):
+    """Seconds per call of func(): (median, min). Calls per repeat are scaled so a repeat lasts min_time."""
+    func()
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    times = [elapsed / number]
+    for _ in range(repeat - 1):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - t0) / number)
+    return statistics.median(times), min(times)
+
+
+class Results:
+    def __init__(self, quick):
+        self.quick = quick
+        self.min_time = 0.02 if quick else 0.2
+        self.repeat = 3 if quick else 5
+        self.entries = []
+
+    def time(self, group, name, func, nbytes=None, **params):
+        median, best = measure(func, self.min_time, self.repeat)
+        entry = {"group": group, "name": name, "params": params, "unit": "s/op", "median": median, "min": best}
+        if nbytes is not None:
+            entry["bytes"] = nbytes
+            entry["bytes_per_s"] = nbytes / median
+        self.add(entry)
+
+    def add(self, entry):
+        self.entries.append(entry)
+        if "skipped" in entry:
+            print(f"{entry['group']:14s} {entry['name']:48s} skipped: {entry['skipped']}")
+            return
+        line = f"{entry['group']:14s} {entry['name']:48s} {entry['median'] * 1e6:12.1f} {entry['unit'].replace('s/', 'us/')}"
+        if "bytes_per_s" in entry:
+            line += f"  {entry['bytes_per_s'] / 1e6:10.1f} MB/s"
+        if "updates_per_s" in entry:
+            line += f"  {entry['updates_per_s']:10.1f} updates/s  {entry['frames_per_s']:6.1f} frames/s"
+        print(line, flush=True)
+
+    def skip(self, group, name, reason):
+        self.add({"group": group, "name": name, "skipped": reason})
+
+
+# Stand-in services ---------------------------------------------------------------------------
+
+class Echo:
+    def echo(self, x):
+        return x
+
+    def size(self, x):
+        return len(x)
+
+
+class Canvas:
+    """Pretends to be a visualizer: updates are stored, frames are counted by the spin callback."""
+
+    def __init__(self):
+        self.data = None
+        self.frames = 0
+        self.updates = 0
+
+    def update(self, x):
+        self.data = x
+        self.updates += 1
+
+    def counts(self):
+        return (self.frames, self.updates)
+
+
+class EchoHost(ServiceHost):
+    def create_wrapper_service(self, **kwargs):
+        if kwargs.get("spin", False):
+            return (0, AsyncWrapperService(Echo(), lambda: None, spinrate=1000))
+        return (0, WrapperService(Echo()))
+
+
+class CanvasHost(ServiceHost):
+    def create_wrapper_service(self, **kwargs):
+        canvas = Canvas()
+
+        def spin():
+            canvas.frames += 1
+        return (0, AsyncWrapperService(canvas, spin, spinrate=kwargs.get("spinrate", 60)))
+
+
+# Benchmarks ----------------------------------------------------------------------------------
+
+def _roundtrip(obj):
+    data = brine.dump(obj)
+    return lambda: brine.load(brine.dump(obj)), len(data)
+
+
+def bench_serialization(results):
+    group = "serialization"
+    sizes = (100, 10_000) if results.quick else (100, 10_000, 1_000_000)
+    for dtype in ("float64", "float32", "int64", "uint8", "bool"):
+        for n in sizes:
+            array = np.ones(n, dtype=dtype)
+            results.time(group, f"dump numpy {dtype}[{n}]", lambda: brine.dump(array),
+                         nbytes=array.nbytes, kind="dump", dtype=dtype, size=n)
+            data = brine.dump(array)
+            results.time(group, f"load numpy {dtype}[{n}]", lambda: brine.load(data),
+                         nbytes=array.nbytes, kind="load", dtype=dtype, size=n)
+    array = np.asfortranarray(np.ones((1000, 100)))
+    func, _ = _roundtrip(array)
+    results.time(group, "roundtrip numpy float64[1000,100] F-order", func, nbytes=array.nbytes, kind="roundtrip")
+    array = np.ones((2000, 200))[::2, ::2]
+    func, _ = _roundtrip(array)
+    results.time(group, "roundtrip numpy float64 strided view", func, nbytes=array.nbytes, kind="roundtrip")
+
+    for n in (100, 10_000):
+        labels = np.array([f"label {i}" for i in range(n)], dtype=object)
+        func, nbytes = _roundtrip(labels)
+        results.time(group, f"roundtrip object array str[{n}]", func, nbytes=nbytes, kind="roundtrip", size=n)
+        mixed = np.array([i if i % 2 else float(i) for i in range(n)], dtype=object)
+        func, nbytes = _roundtrip(mixed)
+        results.time(group, f"roundtrip object array int/float[{n}]", func, nbytes=nbytes, kind="roundtrip", size=n)
+        strings = np.array([f"label {i}" for i in range(n)])
+        func, nbytes = _roundtrip(strings)
+        results.time(group, f"roundtrip unicode array[{n}]", func, nbytes=nbytes, kind="roundtrip", size=n)
+
+    # Lists go by reference over rpyc. This is the by-value equivalent, see the rpc group for lists.
+    for n in (10, 1000):
+        nested = tuple(tuple(float(j) for j in range(10)) for _ in range(n))
+        func, nbytes = _roundtrip(nested)
+        results.time(group, f"roundtrip nested tuple {n}x10 float", func, nbytes=nbytes, kind="roundtrip", size=n)
+
+    try:
+        import torch
+    except ImportError:
+        results.skip(group, "torch tensors", "torch is not installed")
+    else:
+        for n in sizes:
+            tensor = torch.ones(n)
+            results.time(group, f"dump torch float32[{n}]", lambda: brine.dump(tensor),
+                         nbytes=n * 4, kind="dump", size=n)
+
+    try:
+        from PIL import Image
+    except ImportError:
+        results.skip(group, "PIL images", "PIL is not installed")
+    else:
+        for mode in ("L", "RGB", "RGBA"):
+            image = Image.new(mode, (640, 480))
+            func, nbytes = _roundtrip(image)
+            results.time(group, f"roundtrip PIL {mode} 640x480", func, nbytes=nbytes, kind="roundtrip", mode=mode)
+
+
+def random_walk(n):
+    """Plot-like float64 data. Unlike zeros, the channel's zlib can't shrink it for free."""
+    return np.cumsum(np.random.default_rng(0).standard_normal(n))
+
+
+def bench_rpc(results):
+    group = "rpc"
+    payloads = {
+        "int": 1,
+        "4x4 float64": np.random.default_rng(0).standard_normal((4, 4)),
+        "64 KB float64": random_walk(8192),
+        "1 MB float64": random_walk(1 << 17),
+    }
+    for transport in TRANSPORTS:
+        for spin in (False, True):
+            service = "async" if spin else "sync"
+            host = EchoHost()
+            host.start(transport=transport, spin=spin)
+            try:
+                for name, payload in payloads.items():
+                    nbytes = getattr(payload, "nbytes", None)
+                    results.time(group, f"echo {name} {transport} {service}", lambda: host.echo(payload),
+                                 nbytes=nbytes, transport=transport, service=service, payload=name)
+                nested = [[float(j) for j in range(10)] for _ in range(10)]
+                results.time(group, f"len of nested list 10x10 {transport} {service}", lambda: host.size(nested),
+                             transport=transport, service=service, payload="nested list 10x10")
+            finally:
+                host.stop()
+
+
+def bench_startup(results):
+    group = "startup"
+    repeat = 3 if results.quick else 10
+    for transport in TRANSPORTS:
+        times = []
+        for _ in range(repeat):
+            host = EchoHost()
+            t0 = time.perf_counter()
+            host.start(transport=transport)
+            times.append(time.perf_counter() - t0)
+            host.stop()
+        results.add({"group": group, "name": f"start {transport}", "params": {"transport": transport},
+                     "unit": "s/op", "median": statistics.median(times), "min": min(times)})
+    with WarmPool(EchoHost, size=1) as pool:
+        times = []
+        for _ in range(repeat):
+            host = EchoHost()
+            t0 = time.perf_counter()
+            host.start(transport="unix", pool=pool)
+            times.append(time.perf_counter() - t0)
+            host.stop()
+        results.add({"group": group, "name": "start unix pooled", "params": {"transport": "unix", "pool": True},
+                     "unit": "s/op", "median": statistics.median(times), "min": min(times)})
+
+
+def bench_spin(results):
+    group = "spin"
+    duration = 0.5 if results.quick else 2.0
+    payload = random_walk(1000)
+    for mode in ("sync", "channel"):
+        host = CanvasHost()
+        host.start(transport="unix", spinrate=60)
+        try:
+            frames0, updates0 = host.counts()
+            t0 = time.perf_counter()
+            if mode == "sync":
+                while time.perf_counter() - t0 < duration:
+                    host.update(payload)
+            else:
+                channel = host.update_channel(window=2, policy="block")
+                while time.perf_counter() - t0 < duration:
+                    with channel.frame():
+                        host.update(payload)
+                channel.flush()
+            elapsed = time.perf_counter() - t0
+            frames, updates = host.counts()
+        finally:
+            host.stop()
+        results.add({"group": group, "name": f"updates/s {mode}", "params": {"mode": mode},
+                     "unit": "s/op", "median": elapsed / max(updates - updates0, 1), "min": None,
+                     "updates_per_s": (updates - updates0) / elapsed, "frames_per_s": (frames - frames0) / elapsed})
+
+
+def bench_matplotlib(results):
+    group = "matplotlib"
+    try:
+        from plot_wrapper import MatplotlibWrapper
+    except ImportError:
+        results.skip(group, "MatplotlibWrapper", "matplotlib is not installed")
+        return
+    x = np.linspace(0, 1, 1000)
+    plt = MatplotlibWrapper()
+    plt.start(transport="unix")
+    try:
+        results.time(group, "plot 1000 points + draw", lambda: (plt.clf(), plt.plot(x, x), plt.gcf().canvas.draw()))
+        def batched():
+            with plt.batch():
+                plt.clf()
+                plt.plot(x, x)
+                plt.gcf().canvas.draw()
+        results.time(group, "plot 1000 points + draw, batched", batched)
+    finally:
+        plt.stop()
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "rpyc": rpyc.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quick", action="store_true", help="Fewer sizes and shorter repeats.")
+    parser.add_argument("--only", default=",".join(GROUPS), help=f"Comma separated groups out of {GROUPS}.")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this file.")
+    args = parser.parse_args()
+
+    groups = args.only.split(",")
+    for group in groups:
+        if group not in GROUPS:
+            parser.error(f"unknown group {group}, expected some of {GROUPS}")
+    results = Results(args.quick)
+    for group in groups:
+        globals()[f"bench_{group}"](results)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"meta": metadata(), "quick": args.quick, "results": results.entries}, f, indent=1)
+        print(f"wrote {args.output}")
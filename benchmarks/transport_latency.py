@@ -0,0 +1,58 @@
+"""
+Round trip latency of each ServiceHost transport, against a stand-in service (no display needed).
+
+    python benchmarks/transport_latency.py [--calls N]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from plot_wrapper import ServiceHost, WrapperService, AsyncWrapperService
+from plot_wrapper._plot_wrapper import TRANSPORTS
+
+
+class Echo:
+    def echo(self, x):
+        return x
+
+
+class EchoHost(ServiceHost):
+    def create_wrapper_service(self, **kwargs):
+        if kwargs.get("spin", False):
+            return (0, AsyncWrapperService(Echo(), lambda: None, spinrate=1000))
+        return (0, WrapperService(Echo()))
+
+
+def measure(transport, payload, calls, spin):
+    host = EchoHost()
+    host.start(transport=transport, spin=spin)
+    echo = host.echo
+    for _ in range(10):
+        echo(payload)
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        echo(payload)
+    elapsed = time.perf_counter() - t0
+    host.stop()
+    return elapsed / calls
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Random walks, like plotted data. zlib in the rpyc channel would squeeze zeros down to nothing.
+    payloads = {
+        "int": 1,
+        "4x4 float64": rng.standard_normal((4, 4)),
+        "64 KB float64": np.cumsum(rng.standard_normal(8192)),
+    }
+    for spin in (False, True):
+        service = "AsyncWrapperService" if spin else "WrapperService"
+        for name, payload in payloads.items():
+            for transport in TRANSPORTS:
+                latency = measure(transport, payload, args.calls, spin)
+                print(f"{service:20s} {name:14s} {transport:11s} {latency * 1e6:8.1f} us/call")
@@ -11,12 +11,11 @@ running matplotlib in the parent process.
 from plot_wrapper import InteractiveMatplotlibWrapper
 plt = InteractiveMatplotlibWrapper()
 # Accepts keyword arguments:
-#   spinrate: Controls the plt.pause() duration to be 1/spinrate.
-#             If your plots are not showing up, this should be decreased
-#               to give matplotlib more time to draw the canvas.
+#   spinrate: Frames per second to redraw the figure at.
+#             Requests from the parent are served in between frames.
 #
-#             Default: 80
-plt.start(spinrate=80)
+#             Default: 40
+plt.start(spinrate=40)
 
 # Interactive terminal
 import select, sys, termios, tty
@@ -28,19 +27,12 @@ def getKey():
         return sys.stdin.read(1)
     return None
 
-# Bind asynchronous methods to be fully nonblocking
-# Unfortunately, this tends to fail for some reason, over very slow connections
-#    (ex. X forwarding)
-import rpyc
-clf = rpyc.async_(plt.clf)
-plot = rpyc.async_(plt.plot)
-
 try:
     print("Flappy Line")
     print("Press w in the terminal to jump, q to exit")
     plt.figure(0)
-    x_history = [0]*20
-    plt.plot(x_history)
+    # The child keeps the last 20 samples, only new ones are sent.
+    plt.series("height", capacity=20)
     plt.show()
     x = 0
     v = 0
@@ -56,11 +48,8 @@ try:
         x += v
         if x < 0:
             x = 0
-        x_history.pop(0)
-        x_history.append(x)
         i += 1
-        clf()
-        plot(x_history)
+        plt.append("height", x)
 
 finally:
     termios.tcsetattr(sys.stdin, termios.TCSADRAIN, settings)
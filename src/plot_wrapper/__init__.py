@@ -1,9 +1,13 @@
 from . import _brine_array_patch
-from . import _brine_torch_patch
-from . import _brine_PIL_patch
-# Maybe, load modules on demand?
+from ._brine_array_patch import set_tensor_format, Colors
+# torch, PIL and open3d patches load on demand, the first time one of their objects is sent or received.
+from ._brine_patch import load_imported_patches
+load_imported_patches()
 
 from ._plot_wrapper import WrapperService, AsyncWrapperService, ServiceHost
+from ._pool import WarmPool
+from ._array_codec import ArrayCodec
+from ._figure_farm import FigureFarm
 
 try:
     from ._matplotlib import MatplotlibWrapper, InteractiveMatplotlibWrapper
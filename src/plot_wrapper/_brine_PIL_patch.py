@@ -1,16 +1,32 @@
-"""load/dump monkeypatch functions for PIL Images. Saves only the raw array data"""
+"""load/dump monkeypatch functions for PIL Images.
+
+Images are sent in their own mode (tobytes, one copy) with their size, palette and transparency,
+so palette, I;16, CMYK... images come back as they were. Connections with an ArrayCodec that sets
+`image_format` send large images PNG or JPEG encoded instead.
+"""
+import io
+import time
+
 from rpyc.core import brine, netref
 
 try:
     from _brine_patch import register
-    from _brine_array_patch import _dump_array
+    from _array_codec import current_codec
 except ImportError:
     from ._brine_patch import register
-    from ._brine_array_patch import _dump_array
+    from ._array_codec import current_codec
+
+IMAGE_RAW = 0
+IMAGE_PNG = 1
+IMAGE_JPEG = 2
+
+# Modes each format stores without conversion. Other modes are sent raw
+# (ex. "I", which PNG saves as 16 bit).
+PNG_MODES = {"1", "L", "LA", "I;16", "RGB", "RGBA", "P"}
+JPEG_MODES = {"L", "RGB", "CMYK"}
 
 try:
     from PIL import Image
-    import numpy as np
 
     @register(brine._custom_dumpable)
     def _dumpable_image(obj):
@@ -20,17 +36,78 @@ try:
 
     @register(brine._custom_loaders)
     def _load_image(stream):
+        mode = brine._load(stream)
+        size = brine._load(stream)
+        encoding = brine._load(stream)
+        palette = brine._load(stream)
+        transparency = brine._load(stream)
+        if encoding != IMAGE_RAW:
+            raw_bytes = brine._load(stream)
         data = brine._load(stream)
-        return Image.fromarray(data)
+        codec = current_codec()
+        start = time.perf_counter()
+        if encoding == IMAGE_RAW:
+            image = Image.frombytes(mode, size, data)
+            if palette is not None:
+                image.putpalette(palette[1], rawmode=palette[0])
+        else:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        if transparency is not None:
+            image.info["transparency"] = transparency
+        if codec is not None and encoding != IMAGE_RAW:
+            codec.arrays_received += 1
+            codec.raw_bytes_received += raw_bytes
+            codec.wire_bytes_received += len(data)
+            codec.decode_time += time.perf_counter() - start
+        return image
+
+    def _encode_image(obj, codec):
+        """Returns (encoding, bytes, raw size) for the image as it should go on the wire."""
+        raw = obj.tobytes()
+        if codec is None or codec.image_format is None or len(raw) < codec.image_threshold:
+            return IMAGE_RAW, raw, len(raw)
+        start = time.perf_counter()
+        buf = io.BytesIO()
+        if codec.image_format == "jpeg" and obj.mode in JPEG_MODES:
+            obj.save(buf, format="JPEG", quality=codec.jpeg_quality)
+            encoding = IMAGE_JPEG
+        elif obj.mode in PNG_MODES:
+            # Lossless fallback for modes JPEG can't hold (alpha, palette...).
+            obj.save(buf, format="PNG", compress_level=codec.png_compress_level)
+            encoding = IMAGE_PNG
+        else:
+            return IMAGE_RAW, raw, len(raw)
+        data = buf.getvalue()
+        codec.arrays_sent += 1
+        codec.raw_bytes_sent += len(raw)
+        codec.wire_bytes_sent += len(data)
+        codec.encode_time += time.perf_counter() - start
+        return encoding, data, len(raw)
 
     @register(brine._custom_dumpers)
     def _dump_image(obj, stream):
         if isinstance(obj, Image.Image):
+            encoding, data, raw_bytes = _encode_image(obj, current_codec())
+            palette = None
+            if encoding == IMAGE_RAW and obj.mode in ("P", "PA") and obj.palette is not None:
+                palette_mode = obj.palette.mode
+                palette = (palette_mode, bytes(obj.getpalette(palette_mode)))
+            transparency = obj.info.get("transparency")
+            if not brine.dumpable(transparency):
+                transparency = None
             stream.append(brine.TAG_CUSTOM)
             brine._dump_int(_load_image.id, stream)
-            _dump_array(np.array(obj), stream)
+            brine._dump_str(obj.mode, stream)
+            brine._dump_tuple(obj.size, stream)
+            brine._dump_int(encoding, stream)
+            brine._dump(palette, stream)
+            brine._dump(transparency, stream)
+            if encoding != IMAGE_RAW:
+                brine._dump_int(raw_bytes, stream)
+            brine._dump_bytes(data, stream)
             return True
         return False
 
 except Exception as e:
-    print("Could not load Image save patches... perhaps PIL or numpy is not installed?")
+    print("Could not load Image save patches... perhaps PIL is not installed?")
@@ -1,12 +1,21 @@
 """load/dump monkeypatch functions for numpy arrays and numpy numeric data types."""
+import ast
 from functools import reduce
+import hashlib
 import operator
+import struct
+import sys
+import time
 
 from rpyc.core import brine
 try:
     from _brine_patch import register
+    from _shared_memory import HEADER_SIZE
+    from _array_codec import ArrayCodec, current_codec, current_cache, current_shm_pool, COMPRESSION_NONE
 except ImportError:
     from ._brine_patch import register
+    from ._shared_memory import HEADER_SIZE
+    from ._array_codec import ArrayCodec, current_codec, current_cache, current_shm_pool, COMPRESSION_NONE
 
 try:
     import numpy as np
@@ -34,53 +43,414 @@ try:
     ]
     NP_TYPES = NP_INTEGER + NP_FLOAT + NP_COMPLEX
 
+    # What received torch tensors become in this process, see set_tensor_format.
+    tensor_format = "numpy"
+
+    def set_tensor_format(format):
+        """Load tensors sent by the other process as "numpy" arrays (default, torch is never imported)
+        or as "torch" tensors (bfloat16, complex32 and quantized dtypes kept as they are).
+        numpy widens bfloat16 to float32, complex32 to complex64 and dequantizes quantized tensors.
+
+        Call it in the process that receives, ex. in create_wrapper_service for the wrapper process.
+        """
+        global tensor_format
+        if format not in ("numpy", "torch"):
+            raise ValueError(f"Unknown tensor format {format}, expected \"numpy\" or \"torch\"")
+        tensor_format = format
+
+    class Colors:
+        """Marks an array of colors with values in [0, 1], ex. shaped (N, 3) or (H, W, 4),
+        so an ArrayCodec with `quantize_colors` may send it as uint8.
+        The other side receives the plain array, in its original dtype.
+        ```
+        host.scatter(x, y, c=Colors(rgb))
+        ```
+        """
+        __slots__ = ("array",)
+
+        def __init__(self, array):
+            self.array = np.asarray(array)
+
     @register(brine._custom_dumpable)
     def _dumpable_numpy(obj):
-        if type(obj) in NP_TYPES:
+        if type(obj) in NP_TYPES or type(obj) is Colors:
             return True
         if isinstance(obj, np.ndarray):
             if obj.dtype == object:
-                for elem in obj.reshape(-1, copy=False):
-                    if not brine.dumpable(elem):
-                        return False
+                items = obj.reshape(-1).tolist()
+                return _dumpable_items(items, set(map(type, items)))
             return True
         return False
+    # Object arrays are dumpable depending on their elements.
+    brine._volatile_dumpable.add(np.ndarray)
+
+    # Compact array header: dtype code, flags, ndim, then the packed shape.
+    # Dtypes missing from this table are sent as a dtype string after the shape.
+    DTYPE_CODES = {np.dtype(t): i for i, t in enumerate(NP_TYPES)}
+    DTYPE_TABLE = [np.dtype(t) for t in NP_TYPES]
+    DTYPE_OTHER = 0xFF
+
+    FLAG_BIG_ENDIAN = 0x01
+    FLAG_FORTRAN = 0x02
+    FLAG_SHM = 0x04
+    # Sent through the connection's ArrayCodec, see _dump_array_encoded.
+    FLAG_ENCODED = 0x08
+    # Bits 4-5 pick the width of each shape entry.
+    DIM_FORMATS = ["B", "H", "I", "Q"]
+    DIM_SHIFT = 4
+
+    ARRAY_HEADER = struct.Struct("<BBB")
+
+    def _pack_header(obj, flags, stream):
+        dtype = obj.dtype
+        code = DTYPE_CODES.get(dtype.newbyteorder("="), DTYPE_OTHER)
+        if code != DTYPE_OTHER:
+            if dtype.byteorder == ">" or (dtype.byteorder == "=" and sys.byteorder == "big"):
+                flags |= FLAG_BIG_ENDIAN
+        largest = max(obj.shape, default=0)
+        width = 0 if largest < 1 << 8 else 1 if largest < 1 << 16 else 2 if largest < 1 << 32 else 3
+        flags |= width << DIM_SHIFT
+        stream.append(ARRAY_HEADER.pack(code, flags, obj.ndim)
+                      + struct.pack(f"<{obj.ndim}{DIM_FORMATS[width]}", *obj.shape))
+        if code == DTYPE_OTHER:
+            # Structured dtypes only round trip through their descr.
+            brine._dump_str(repr(dtype.str if dtype.fields is None else dtype.descr), stream)
+
+    def _unpack_header(stream):
+        code, flags, ndim = ARRAY_HEADER.unpack(stream.read(ARRAY_HEADER.size))
+        dim_format = struct.Struct(f"<{ndim}{DIM_FORMATS[(flags >> DIM_SHIFT) & 0x3]}")
+        shape = dim_format.unpack(stream.read(dim_format.size))
+        if code == DTYPE_OTHER:
+            dtype = np.dtype(ast.literal_eval(brine._load(stream)))
+        else:
+            dtype = DTYPE_TABLE[code].newbyteorder(">" if flags & FLAG_BIG_ENDIAN else "<")
+        return shape, dtype, flags
 
     @register(brine._custom_loaders)
     def _load_array(stream):
-        shape = brine._load(stream)
-        dtype = brine._load(stream)
-        data = brine._load(stream)
-        array = np.frombuffer(data, dtype=dtype).reshape(shape)
+        shape, dtype, flags = _unpack_header(stream)
+        order = "F" if flags & FLAG_FORTRAN else "C"
+        if flags & FLAG_SHM:
+            return _load_array_shm(stream, shape, dtype, order)
+        if flags & FLAG_ENCODED:
+            return _load_array_encoded(stream, shape, dtype, order)
+        # Read straight into a bytearray, so the array is writable without another copy.
+        data = bytearray(reduce(operator.mul, shape, 1) * dtype.itemsize)
+        stream.readinto(data)
+        return np.frombuffer(data, dtype=dtype).reshape(shape, order=order)
+
+    def _load_array_shm(stream, shape, dtype, order):
+        name = brine._load(stream)
+        offset = brine._load(stream)
+        pool = current_shm_pool()
+        if pool is None:
+            raise ValueError("received a shared memory array on a connection without shared memory")
+        seg = pool.attach(name)
+        view = np.ndarray(shape, dtype=dtype, buffer=seg.buf, offset=offset, order=order)
+        # Copy out so the writer can reuse the segment for the next array.
+        array = view.copy(order="A")
+        del view
+        pool.release(seg)
         return array
 
-    def _dump_array(obj, stream):
-        """Dump four things.
-        
-        array tag, tuple for shape, string for dtype, tuple (flat) for data.
+    def _dump_array_shm(obj, pool, stream):
+        """Copy the array into a shared memory segment of the pool and dump a descriptor for it.
+
+        Returns False if no segment is available.
         """
+        seg = pool.acquire(obj.nbytes)
+        if seg is None:
+            return False
+        fortran = obj.flags.f_contiguous and not obj.flags.c_contiguous
+        order = "F" if fortran else "C"
+        view = np.ndarray(obj.shape, dtype=obj.dtype, buffer=seg.buf, offset=HEADER_SIZE, order=order)
+        np.copyto(view, obj, casting="no")
+        del view
         stream.append(brine.TAG_CUSTOM)
         brine._dump_int(_load_array.id, stream)
-        brine._dump_tuple(obj.shape, stream)
-        brine._dump_str(str(obj.dtype), stream)
-        brine._dump_bytes(obj.tobytes(), stream)
+        _pack_header(obj, FLAG_SHM | (FLAG_FORTRAN if fortran else 0), stream)
+        brine._dump_str(seg.name, stream)
+        brine._dump_int(HEADER_SIZE, stream)
+        return True
+
+    LOSSY_NONE = 0
+    LOSSY_DOWNCAST = 1
+    LOSSY_QUANTIZED = 2
+
+    def _reduce_precision(obj, codec, colors):
+        """Returns (array to send, lossy kind)."""
+        if obj.dtype.kind != "f" or obj.dtype.newbyteorder("=") not in DTYPE_CODES:
+            return obj, LOSSY_NONE
+        if colors and codec.quantize_colors and obj.size > 0:
+            if obj.min() >= 0 and obj.max() <= 1:
+                return np.rint(obj * 255).astype(np.uint8), LOSSY_QUANTIZED
+        if codec.downcast is not None and obj.dtype.itemsize > np.dtype(codec.downcast).itemsize:
+            return obj.astype(codec.downcast), LOSSY_DOWNCAST
+        return obj, LOSSY_NONE
+
+    def _dump_array_encoded(obj, codec, stream, colors=False):
+        """Header of the array as sent, then the method byte (compression | lossy kind << 4),
+        the original dtype code if lossy, and the (possibly compressed) data.
+        """
+        start = time.perf_counter()
+        data, lossy = _reduce_precision(obj, codec, colors)
+        flags = FLAG_ENCODED
+        if data.flags.c_contiguous:
+            pass
+        elif data.flags.f_contiguous:
+            data = data.T
+            flags |= FLAG_FORTRAN
+        else:
+            data = np.ascontiguousarray(data)
+        raw = memoryview(data.reshape(-1).view(np.uint8))
+        method, payload = codec.compress(raw)
+        stream.append(brine.TAG_CUSTOM)
+        brine._dump_int(_load_array.id, stream)
+        _pack_header(data.T if flags & FLAG_FORTRAN else data, flags, stream)
+        brine._dump_int(method | (lossy << 4), stream)
+        if lossy != LOSSY_NONE:
+            brine._dump_int(DTYPE_CODES[obj.dtype.newbyteorder("=")], stream)
+        if payload is None:
+            stream.append(raw)
+            wire_bytes = len(raw)
+        else:
+            brine._dump_bytes(payload, stream)
+            wire_bytes = len(payload)
+        codec.arrays_sent += 1
+        codec.raw_bytes_sent += obj.nbytes
+        codec.wire_bytes_sent += wire_bytes
+        codec.encode_time += time.perf_counter() - start
+
+    def _load_array_encoded(stream, shape, dtype, order):
+        start = time.perf_counter()
+        method = brine._load(stream)
+        lossy = method >> 4
+        method &= 0xF
+        if lossy != LOSSY_NONE:
+            original = DTYPE_TABLE[brine._load(stream)]
+        nbytes = reduce(operator.mul, shape, 1) * dtype.itemsize
+        if method == COMPRESSION_NONE:
+            data = bytearray(nbytes)
+            stream.readinto(data)
+            wire_bytes = nbytes
+        else:
+            payload = brine._load(stream)
+            wire_bytes = len(payload)
+            data = bytearray(ArrayCodec.decompress(method, payload))
+        array = np.frombuffer(data, dtype=dtype).reshape(shape, order=order)
+        if lossy == LOSSY_QUANTIZED:
+            array = np.multiply(array, 1 / 255, dtype=original)
+        elif lossy == LOSSY_DOWNCAST:
+            array = array.astype(original)
+        codec = current_codec()
+        if codec is not None:
+            codec.arrays_received += 1
+            codec.raw_bytes_received += array.nbytes
+            codec.wire_bytes_received += wire_bytes
+            codec.decode_time += time.perf_counter() - start
+        return array
+
+    CACHED_REF = 0
+    CACHED_NEW = 1
+
+    def _digest(obj, colors):
+        """blake2b of the dtype, shape, order and memory of the array, and whether it holds colors
+        (those may come back quantized).
+        """
+        order = "C"
+        if obj.flags.c_contiguous:
+            data = obj
+        elif obj.flags.f_contiguous:
+            data = obj.T
+            order = "F"
+        else:
+            data = np.ascontiguousarray(obj)
+        h = hashlib.blake2b(f"{obj.dtype.str}{obj.shape}{order}{'c' if colors else ''}".encode(), digest_size=16)
+        h.update(memoryview(data.reshape(-1).view(np.uint8)))
+        return h.digest()
+
+    @register(brine._custom_loaders)
+    def _load_array_cached(stream):
+        kind = brine._load(stream)
+        cache = current_cache()
+        if cache is None:
+            raise ValueError("received a cached array on a connection without an array cache")
+        if kind == CACHED_REF:
+            digest = brine._load(stream)
+            array = cache.store.get(digest)
+            if array is None:
+                raise KeyError(f"cached array {digest.hex()} is not in this side's store")
+            current_codec().cache_hits_received += 1
+        else:
+            for dropped in brine._load(stream):
+                cache.store.pop(dropped, None)
+            digest = brine._load(stream)
+            array = cache.store[digest] = brine._load(stream)
+        # The kept array is never handed out, so changing what we return can't corrupt later hits.
+        return array.copy(order="K")
+
+    def _dump_array_cached(obj, cache, stream, colors):
+        """Send the digest if the other side keeps this array, otherwise the array for it to keep.
+
+        Returns False for arrays the cache can't hold.
+        """
+        if obj.nbytes > cache.budget:
+            return False
+        codec = current_codec()
+        digest = _digest(obj, colors)
+        stream.append(brine.TAG_CUSTOM)
+        brine._dump_int(_load_array_cached.id, stream)
+        if cache.hit(digest):
+            brine._dump_int(CACHED_REF, stream)
+            brine._dump_bytes(digest, stream)
+            codec.cache_hits += 1
+            codec.cache_bytes_saved += obj.nbytes
+            return True
+        brine._dump_int(CACHED_NEW, stream)
+        brine._dump_tuple(tuple(cache.keep(digest, obj.nbytes)), stream)
+        brine._dump_bytes(digest, stream)
+        _dump_array_data(obj, stream, colors)
+        codec.cache_misses += 1
+        return True
+
+    def _dump_array(obj, stream, colors=False):
+        """Dump a compact header, then the raw array memory.
+
+        Contiguous arrays (C or Fortran order) are appended to the stream as a memoryview,
+        without copying. Other strided views are made contiguous once.
+        Large arrays go through the connection's shared memory pool instead, if it has one, or else through
+        the connection's ArrayCodec if it has one. With a codec cache, arrays the other side
+        already has are replaced by their digest, for messages dumped by Connection._send.
+
+        `colors` marks arrays of colors, which the codec may quantize (see Colors).
+        """
+        cache = current_cache()
+        if cache is not None and cache.active and obj.nbytes >= current_codec().cache_threshold:
+            if _dump_array_cached(obj, cache, stream, colors):
+                return
+        _dump_array_data(obj, stream, colors)
+
+    def _dump_array_data(obj, stream, colors=False):
+        pool = current_shm_pool()
+        if pool is not None and obj.nbytes >= pool.threshold:
+            if _dump_array_shm(obj, pool, stream):
+                return
+        codec = current_codec()
+        if codec is not None and obj.nbytes >= codec.threshold:
+            _dump_array_encoded(obj, codec, stream, colors)
+            return
+        flags = 0
+        if obj.flags.c_contiguous:
+            data = obj
+        elif obj.flags.f_contiguous:
+            # Transpose of a Fortran array is C-contiguous over the same memory.
+            data = obj.T
+            flags = FLAG_FORTRAN
+        else:
+            data = np.ascontiguousarray(obj)
+        stream.append(brine.TAG_CUSTOM)
+        brine._dump_int(_load_array.id, stream)
+        _pack_header(obj, flags, stream)
+        # Length is implied by the header. brine.dump joins the stream, so the view is never copied twice.
+        stream.append(memoryview(data.reshape(-1).view(np.uint8)))
+
+    def _pack_strings(items, stream):
+        """Dump a list of str or bytes as lengths plus one concatenated buffer."""
+        if len(items) > 0 and type(items[0]) is str:
+            blob = "".join(items).encode("utf-8")
+        else:
+            blob = b"".join(items)
+        # Lengths are in characters for str, so the loader can slice the decoded text.
+        lengths = np.fromiter(map(len, items), dtype=np.uint32, count=len(items))
+        longest = lengths.max(initial=0)
+        if longest < 1 << 16:
+            lengths = lengths.astype(np.uint8 if longest < 1 << 8 else np.uint16)
+        _dump_array(lengths, stream)
+        brine._dump_bytes(blob, stream)
+
+    def _unpack_strings(stream, is_str):
+        lengths = brine._load(stream)
+        blob = brine._load(stream)
+        if is_str:
+            blob = blob.decode("utf-8")
+        ends = np.cumsum(lengths, dtype=np.int64)
+        starts = ends - lengths.astype(np.int64)
+        return list(map(blob.__getitem__, map(slice, starts.tolist(), ends.tolist())))
+
+    # Object arrays holding a single type of these are sent packed instead of element by element.
+    OBJECT_GENERIC = 0
+    OBJECT_STR = 1
+    OBJECT_BYTES = 2
+    OBJECT_NUMERIC = 3
+    OBJECT_PACKED = {str: OBJECT_STR, bytes: OBJECT_BYTES, int: OBJECT_NUMERIC, float: OBJECT_NUMERIC, bool: OBJECT_NUMERIC}
 
     @register(brine._custom_loaders)
     def _load_array_object(stream):
-        # NOTE: is this broken for 0-d arrays? Do I care?
         shape = brine._load(stream)
-        elems = []
+        kind = brine._load(stream)
         n_elems = reduce(operator.mul, shape, 1)
-        for i in range(n_elems):
-            elems.append(brine._load(stream))
-        return np.array(elems, dtype=object).reshape(shape)
+        # Fill an empty array, np.array() would unpack tuple elements into extra dimensions
+        # and does not give a 0-d array back.
+        array = np.empty(n_elems, dtype=object)
+        if kind == OBJECT_NUMERIC:
+            # astype(object) gives back python int/float/bool.
+            array[:] = brine._load(stream).astype(object)
+        elif kind == OBJECT_STR or kind == OBJECT_BYTES:
+            array[:] = _unpack_strings(stream, kind == OBJECT_STR)
+        else:
+            for i in range(n_elems):
+                array[i] = brine._load(stream)
+        return array.reshape(shape)
+
+    def _dumpable_items(items, types):
+        """True if every element of an object array can be dumped. Has no side effects,
+        brine.dumpable() runs on values that may never be dumped.
+        """
+        if types <= brine.simple_types:
+            return True
+        return all(type(elem) in brine.simple_types or brine.dumpable(elem) for elem in items)
 
     def _dump_array_object(obj, stream):
+        """Object arrays holding a single type of OBJECT_PACKED are sent packed, others element by element."""
+        items = obj.reshape(-1).tolist()
+        types = set(map(type, items))
+        kind = OBJECT_PACKED.get(next(iter(types))) if len(types) == 1 else None
+        if kind == OBJECT_NUMERIC:
+            try:
+                packed = np.array(items, dtype=type(items[0]) if type(items[0]) is not int else np.int64)
+            except OverflowError:
+                kind = None
+        if kind is None and not _dumpable_items(items, types):
+            brine._undumpable(obj, stream)
         stream.append(brine.TAG_CUSTOM)
         brine._dump_int(_load_array_object.id, stream)
         brine._dump_tuple(obj.shape, stream)
-        for elem in obj.reshape(-1, copy=False):
-            brine._dump(elem, stream)
+        if kind is None:
+            brine._dump_int(OBJECT_GENERIC, stream)
+            for elem in items:
+                brine._dump(elem, stream)
+        elif kind == OBJECT_NUMERIC:
+            brine._dump_int(kind, stream)
+            _dump_array(packed, stream)
+        else:
+            brine._dump_int(kind, stream)
+            _pack_strings(items, stream)
+
+    @register(brine._custom_loaders)
+    def _load_array_str(stream):
+        shape = brine._load(stream)
+        dtype = np.dtype(brine._load(stream))
+        items = _unpack_strings(stream, dtype.kind == "U")
+        return np.array(items, dtype=dtype).reshape(shape)
+
+    def _dump_array_str(obj, stream):
+        """Fixed-width unicode/bytes arrays, sent as packed UTF-8 instead of padded UTF-32."""
+        stream.append(brine.TAG_CUSTOM)
+        brine._dump_int(_load_array_str.id, stream)
+        brine._dump_tuple(obj.shape, stream)
+        brine._dump_str(obj.dtype.str, stream)
+        # tolist() strips the padding, same as indexing the array would.
+        _pack_strings(obj.reshape(-1).tolist(), stream)
 
     @register(brine._custom_dumpers)
     def _dump_numpy(obj, stream):
@@ -88,8 +458,12 @@ try:
         if isinstance(obj, np.ndarray):
             if obj.dtype == object:
                 _dump_array_object(obj, stream)
+            elif obj.dtype.kind in "US":
+                _dump_array_str(obj, stream)
             else:
                 _dump_array(obj, stream)
+        elif type(obj) is Colors:
+            _dump_array(obj.array, stream, colors=True)
         elif type(obj) in NP_INTEGER:
             brine._dump_int(obj, stream)
         elif type(obj) in NP_FLOAT:
@@ -0,0 +1,36 @@
+"""load/dump monkeypatch functions for references between calls recorded in a batch."""
+from rpyc.core import brine
+try:
+    from _brine_patch import register
+except ImportError:
+    from ._brine_patch import register
+
+
+class BatchRef:
+    """Stands in for the result of an earlier call in the same batch."""
+
+    __slots__ = ["index"]
+
+    def __init__(self, index):
+        self.index = index
+
+    def __repr__(self):
+        return f"BatchRef({self.index})"
+
+
+@register(brine._custom_dumpable)
+def _dumpable_batch_ref(obj):
+    return type(obj) is BatchRef
+
+@register(brine._custom_loaders)
+def _load_batch_ref(stream):
+    return BatchRef(brine._load(stream))
+
+@register(brine._custom_dumpers)
+def _dump_batch_ref(obj, stream):
+    if type(obj) is BatchRef:
+        stream.append(brine.TAG_CUSTOM)
+        brine._dump_int(_load_batch_ref.id, stream)
+        brine._dump_int(obj.index, stream)
+        return True
+    return False
@@ -1,12 +1,19 @@
 """load/dump monkeypatch functions for open3d vectors and objects.
 
 Currently supports:
-    Vector3iVector
-    Vector3dVector
+    Vector3iVector, Vector3dVector, Vector2iVector, Vector2dVector
     TriangleMesh
-        only vertices and triangles
+        vertices, triangles, vertex normals and colors, triangle normals and uvs
     PointCloud
-        only points and colors
+        points, normals and colors
+    LineSet
+        points, lines and colors
+    VoxelGrid
+        voxel size, origin, voxel indices and colors
+
+Geometries send a bitmask of the attributes they have, followed by only those arrays.
+Received arrays are handed to the open3d vector constructors as-is, which is the only copy.
+Color attributes are marked as colors for ArrayCodec(quantize_colors=True).
 """
 from rpyc.core import brine
 try:
@@ -19,21 +26,65 @@ except ImportError:
 import numpy as np
 import open3d as o3d
 
+O3D_TYPES = {
+    o3d.geometry.TriangleMesh,
+    o3d.geometry.PointCloud,
+    o3d.geometry.LineSet,
+    o3d.geometry.VoxelGrid,
+    o3d.utility.Vector3iVector,
+    o3d.utility.Vector3dVector,
+    o3d.utility.Vector2iVector,
+    o3d.utility.Vector2dVector,
+}
+
 @register(brine._custom_dumpable)
 def _dumpable_o3d(obj):
-    if type(obj) == o3d.geometry.TriangleMesh:
-        return True
-    if type(obj) == o3d.geometry.PointCloud:
-        return True
-    if type(obj) == o3d.utility.Vector3iVector:
-        return True
-    if type(obj) == o3d.utility.Vector3dVector:
-        return True
-    return False
+    return type(obj) in O3D_TYPES
+
+
+# (attribute, vector type) for each geometry. Bit i of the mask is set if attribute i is sent.
+TRIMESH_ATTRS = [
+    ("vertices", o3d.utility.Vector3dVector),
+    ("triangles", o3d.utility.Vector3iVector),
+    ("vertex_normals", o3d.utility.Vector3dVector),
+    ("vertex_colors", o3d.utility.Vector3dVector),
+    ("triangle_normals", o3d.utility.Vector3dVector),
+    ("triangle_uvs", o3d.utility.Vector2dVector),
+]
+PCD_ATTRS = [
+    ("points", o3d.utility.Vector3dVector),
+    ("normals", o3d.utility.Vector3dVector),
+    ("colors", o3d.utility.Vector3dVector),
+]
+LINESET_ATTRS = [
+    ("points", o3d.utility.Vector3dVector),
+    ("lines", o3d.utility.Vector2iVector),
+    ("colors", o3d.utility.Vector3dVector),
+]
+
+def _dump_attrs(obj, attrs, stream):
+    # np.asarray on an open3d vector is a view, no copy on this side.
+    arrays = [np.asarray(getattr(obj, name)) for name, _ in attrs]
+    mask = 0
+    for i, array in enumerate(arrays):
+        if len(array) > 0:
+            mask |= 1 << i
+    brine._dump_int(mask, stream)
+    for (name, _), array in zip(attrs, arrays):
+        if len(array) > 0:
+            _dump_array(array, stream, colors=name.endswith("colors"))
+
+def _load_attrs(geom, attrs, stream):
+    mask = brine._load(stream)
+    for i, (name, vector_type) in enumerate(attrs):
+        if mask & (1 << i):
+            setattr(geom, name, vector_type(brine._load(stream)))
+    return geom
+
 
 @register(brine._custom_loaders)
 def _load_o3d_vec3ivec(stream):
-    return o3d.utility.Vector3iVector(np.array(brine._load(stream)))
+    return o3d.utility.Vector3iVector(brine._load(stream))
 @brine.register(brine._dump_registry, o3d.utility.Vector3iVector)
 def _dump_o3d_vec3ivec(obj, stream):
     stream.append(brine.TAG_CUSTOM)
@@ -42,35 +93,82 @@ def _dump_o3d_vec3ivec(obj, stream):
 
 @register(brine._custom_loaders)
 def _load_o3d_vec3dvec(stream):
-    return o3d.utility.Vector3dVector(np.array(brine._load(stream)))
+    return o3d.utility.Vector3dVector(brine._load(stream))
 @brine.register(brine._dump_registry, o3d.utility.Vector3dVector)
 def _dump_o3d_vec3dvec(obj, stream):
     stream.append(brine.TAG_CUSTOM)
     brine._dump_int(_load_o3d_vec3dvec.id, stream)
     _dump_array(np.asarray(obj), stream)
 
+@register(brine._custom_loaders)
+def _load_o3d_vec2ivec(stream):
+    return o3d.utility.Vector2iVector(brine._load(stream))
+@brine.register(brine._dump_registry, o3d.utility.Vector2iVector)
+def _dump_o3d_vec2ivec(obj, stream):
+    stream.append(brine.TAG_CUSTOM)
+    brine._dump_int(_load_o3d_vec2ivec.id, stream)
+    _dump_array(np.asarray(obj), stream)
+
+@register(brine._custom_loaders)
+def _load_o3d_vec2dvec(stream):
+    return o3d.utility.Vector2dVector(brine._load(stream))
+@brine.register(brine._dump_registry, o3d.utility.Vector2dVector)
+def _dump_o3d_vec2dvec(obj, stream):
+    stream.append(brine.TAG_CUSTOM)
+    brine._dump_int(_load_o3d_vec2dvec.id, stream)
+    _dump_array(np.asarray(obj), stream)
+
 @register(brine._custom_loaders)
 def _load_o3d_trimesh(stream):
-    geom = o3d.geometry.TriangleMesh()
-    geom.triangles = brine._load(stream)
-    geom.vertices = brine._load(stream)
-    return geom
+    return _load_attrs(o3d.geometry.TriangleMesh(), TRIMESH_ATTRS, stream)
 @brine.register(brine._dump_registry, o3d.geometry.TriangleMesh)
 def _dump_o3d_trimesh(obj, stream):
     stream.append(brine.TAG_CUSTOM)
     brine._dump_int(_load_o3d_trimesh.id, stream)
-    _dump_o3d_vec3ivec(obj.triangles, stream)
-    _dump_o3d_vec3dvec(obj.vertices, stream)
+    _dump_attrs(obj, TRIMESH_ATTRS, stream)
 
 @register(brine._custom_loaders)
 def _load_o3d_pcd(stream):
-    geom = o3d.geometry.PointCloud()
-    geom.points = brine._load(stream)
-    geom.colors= brine._load(stream)
-    return geom
+    return _load_attrs(o3d.geometry.PointCloud(), PCD_ATTRS, stream)
 @brine.register(brine._dump_registry, o3d.geometry.PointCloud)
 def _dump_o3d_pcd(obj, stream):
     stream.append(brine.TAG_CUSTOM)
     brine._dump_int(_load_o3d_pcd.id, stream)
-    _dump_o3d_vec3dvec(obj.points, stream)
-    _dump_o3d_vec3dvec(obj.colors, stream)
+    _dump_attrs(obj, PCD_ATTRS, stream)
+
+@register(brine._custom_loaders)
+def _load_o3d_lineset(stream):
+    return _load_attrs(o3d.geometry.LineSet(), LINESET_ATTRS, stream)
+@brine.register(brine._dump_registry, o3d.geometry.LineSet)
+def _dump_o3d_lineset(obj, stream):
+    stream.append(brine.TAG_CUSTOM)
+    brine._dump_int(_load_o3d_lineset.id, stream)
+    _dump_attrs(obj, LINESET_ATTRS, stream)
+
+@register(brine._custom_loaders)
+def _load_o3d_voxelgrid(stream):
+    voxel_size = brine._load(stream)
+    origin = brine._load(stream)
+    indices = brine._load(stream)
+    colors = brine._load(stream)
+    if len(indices) == 0:
+        grid = o3d.geometry.VoxelGrid()
+        grid.voxel_size = voxel_size
+        grid.origin = origin
+        return grid
+    # No vectorized constructor from voxels, so build it from one point at the center of each voxel.
+    # Bounds starting at the origin give back the same grid indices.
+    pcd = o3d.geometry.PointCloud()
+    pcd.points = o3d.utility.Vector3dVector(origin + (indices + 0.5) * voxel_size)
+    pcd.colors = o3d.utility.Vector3dVector(colors)
+    max_bound = origin + (indices.max(axis=0) + 1) * voxel_size
+    return o3d.geometry.VoxelGrid.create_from_point_cloud_within_bounds(pcd, voxel_size, origin, max_bound)
+@brine.register(brine._dump_registry, o3d.geometry.VoxelGrid)
+def _dump_o3d_voxelgrid(obj, stream):
+    stream.append(brine.TAG_CUSTOM)
+    brine._dump_int(_load_o3d_voxelgrid.id, stream)
+    voxels = obj.get_voxels()
+    brine._dump_float(float(obj.voxel_size), stream)
+    _dump_array(np.asarray(obj.origin, dtype=np.float64), stream)
+    _dump_array(np.array([voxel.grid_index for voxel in voxels], dtype=np.int32).reshape(-1, 3), stream)
+    _dump_array(np.array([voxel.color for voxel in voxels], dtype=np.float64).reshape(-1, 3), stream, colors=True)
@@ -1,4 +1,7 @@
 """Patch brine dump/load core functionality to make it easier to extend."""
+import importlib
+import sys
+
 from rpyc.core import brine, netref
 
 brine.TAG_CUSTOM = b"\x1c"
@@ -8,46 +11,74 @@ def _undumpable(obj, stream):
 brine._undumpable = _undumpable
 
 brine._custom_dumpable = []
+# type -> the dumpable check that accepted it, or None if no check did.
+brine._custom_dumpable_cache = {}
+# Types whose dumpable answer depends on the value (ex. object arrays), never cached as undumpable.
+brine._volatile_dumpable = set()
 def dumpable(obj):
     """Indicates whether the given object is *dumpable* by brine
 
     :returns: ``True`` if the object is dumpable (e.g., :func:`dump` would succeed),
               ``False`` otherwise
     """
-    if type(obj) in brine.simple_types:
+    obj_type = type(obj)
+    if obj_type in brine.simple_types:
         return True
-    if type(obj) in (tuple, frozenset):
+    if obj_type in (tuple, frozenset):
         return all(dumpable(item) for item in obj)
-    if type(obj) is slice:
+    if obj_type is slice:
         return dumpable(obj.start) and dumpable(obj.stop) and dumpable(obj.step)
-    if type(type(obj)) == netref.NetrefMetaclass:
+    if type(obj_type) == netref.NetrefMetaclass:
         return False
+    try:
+        dumpable_check = brine._custom_dumpable_cache[obj_type]
+    except KeyError:
+        pass
+    else:
+        if dumpable_check is None:
+            return False
+        # A check that rejects this value still holds for the type, keep it cached.
+        return bool(dumpable_check(obj))
     for dumpable_check in brine._custom_dumpable:
         if dumpable_check(obj):
+            brine._custom_dumpable_cache[obj_type] = dumpable_check
             return True
+    if load_patch_for(obj_type):
+        return dumpable(obj)
+    if obj_type not in brine._volatile_dumpable:
+        brine._custom_dumpable_cache[obj_type] = None
     return False
 brine.dumpable = dumpable
 
 brine._custom_dumpers = []
+# type -> the custom dumper that handled it last.
+brine._custom_dumper_cache = {}
 def _dump(obj, stream):
     """Dump an object to a byte stream (list).
 
     First try using brine's existing dumpers. to not degrade performance in average case
-    Then, go through patches and try them one at a time
+    Then, try the dumper that handled this type last time.
+    Finally, go through patches and try them one at a time
     """
     #print("dump", type(obj))
     #print(obj)
-    i = len(stream)
-    if type(obj) in brine._dump_registry:
-        brine._dump_registry.get(type(obj))(obj, stream)
-        #print(stream[i:])
+    obj_type = type(obj)
+    builtin_dumper = brine._dump_registry.get(obj_type)
+    if builtin_dumper is not None:
+        builtin_dumper(obj, stream)
         return
-    if type(obj) == netref:
+    if obj_type == netref:
         brine._undumpable(obj, stream)
+    dumper = brine._custom_dumper_cache.get(obj_type)
+    if dumper is not None and dumper(obj, stream):
+        return
     for dumper in brine._custom_dumpers:
         if dumper(obj, stream):
-            #print(stream[i:])
+            brine._custom_dumper_cache[obj_type] = dumper
             return
+    if load_patch_for(obj_type):
+        brine._dump(obj, stream)
+        return
     brine._undumpable(obj, stream)
 brine._dump = _dump
 
@@ -60,21 +91,99 @@ def dump(obj):
     return res
 #brine.dump = dump
 
-brine._custom_loaders = []
+# Loader ids are written on the wire, so they have to agree between the two processes
+# no matter which patches each of them has loaded. Append new loaders, never reorder.
+LOADERS = [
+    ("_brine_array_patch", "_load_array"),
+    ("_brine_array_patch", "_load_array_object"),
+    ("_brine_array_patch", "_load_array_str"),
+    ("_brine_batch_patch", "_load_batch_ref"),
+    ("_brine_PIL_patch", "_load_image"),
+    ("_brine_o3d_patch", "_load_o3d_vec3ivec"),
+    ("_brine_o3d_patch", "_load_o3d_vec3dvec"),
+    ("_brine_o3d_patch", "_load_o3d_trimesh"),
+    ("_brine_o3d_patch", "_load_o3d_pcd"),
+    ("_brine_o3d_patch", "_load_o3d_vec2ivec"),
+    ("_brine_o3d_patch", "_load_o3d_vec2dvec"),
+    ("_brine_o3d_patch", "_load_o3d_lineset"),
+    ("_brine_o3d_patch", "_load_o3d_voxelgrid"),
+    ("_brine_tensor_patch", "_load_tensor"),
+    ("_brine_array_patch", "_load_array_cached"),
+]
+LOADER_IDS = {key: i for i, key in enumerate(LOADERS)}
+# Loaders missing from the table get ids from here on, in registration order.
+# Those are only stable if both processes register them before forking.
+DYNAMIC_LOADER_BASE = 1024
+
+# Top level module of a type -> patch module that knows how to send it.
+# Imported the first time such an object is dumped, or such a loader id arrives.
+LAZY_PATCHES = {
+    "torch": "_brine_torch_patch",
+    "PIL": "_brine_PIL_patch",
+    "open3d": "_brine_o3d_patch",
+}
+_loaded_patches = set()
+
+def load_patch(name):
+    """Import a patch module (which registers itself). Returns False if it was already loaded."""
+    if name in _loaded_patches:
+        return False
+    _loaded_patches.add(name)
+    if __package__:
+        importlib.import_module("." + name, __package__)
+    else:
+        importlib.import_module(name)
+    return True
+
+def load_patch_for(obj_type):
+    """Load the lazy patch responsible for `obj_type`, if there is one that is not loaded yet."""
+    name = LAZY_PATCHES.get(obj_type.__module__.partition(".")[0])
+    if name is None:
+        return False
+    return load_patch(name)
+
+def load_imported_patches():
+    """Load the patches for libraries the process has already paid to import."""
+    for module, name in LAZY_PATCHES.items():
+        if module in sys.modules:
+            try:
+                load_patch(name)
+            except Exception as e:
+                print(f"plot_wrapper: Could not load {name}: {e}")
+
+brine._custom_loaders = {}
 @brine.register(brine._load_registry, brine.TAG_CUSTOM)
 def _load_custom(stream):
     type_id = brine._load(stream)
     #print("load custom", type_id, brine._custom_loaders[type_id])
-    return brine._custom_loaders[type_id](stream)
+    return _custom_loader(type_id)(stream)
+
+def _custom_loader(type_id):
+    loader = brine._custom_loaders.get(type_id)
+    if loader is None:
+        if type_id >= len(LOADERS):
+            raise ValueError(f"unknown custom loader id {type_id}")
+        load_patch(LOADERS[type_id][0])
+        loader = brine._custom_loaders[type_id]
+    return loader
 
 def register(target):
     def reg(func):
-        func.id = len(target)
-        target.append(func)
+        if target is brine._custom_loaders:
+            key = (func.__module__.rpartition(".")[2], func.__name__)
+            func.id = LOADER_IDS.get(key)
+            if func.id is None:
+                func.id = DYNAMIC_LOADER_BASE + sum(1 for i in target if i >= DYNAMIC_LOADER_BASE)
+            target[func.id] = func
+        else:
+            func.id = len(target)
+            target.append(func)
+        # A new patch can claim types that were already cached.
+        brine._custom_dumpable_cache.clear()
+        brine._custom_dumper_cache.clear()
         return func
     return reg
 
-
 def _load(stream):
     tag = stream.read(1)
     print(tag)
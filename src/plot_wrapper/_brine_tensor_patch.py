@@ -0,0 +1,73 @@
+"""load monkeypatch function for pytorch tensors sent by _brine_torch_patch.
+
+Kept apart from the dumper, so a process that loads tensors as numpy arrays
+(see _brine_array_patch.set_tensor_format()) never imports torch.
+"""
+from rpyc.core import brine
+import numpy as np
+try:
+    from _brine_patch import register
+    import _brine_array_patch
+except ImportError:
+    from ._brine_patch import register
+    from . import _brine_array_patch
+
+# Wire codes of torch dtypes, by name so the loader works without torch. Append only.
+TENSOR_DTYPES = [
+    "bool", "uint8", "int8", "int16", "int32", "int64",
+    "float16", "bfloat16", "float32", "float64",
+    "complex32", "complex64", "complex128",
+    "quint8", "qint8", "qint32",
+    "uint16", "uint32", "uint64",
+]
+TENSOR_DTYPE_CODES = {name: i for i, name in enumerate(TENSOR_DTYPES)}
+
+QSCHEME_NONE = 0
+QSCHEME_PER_TENSOR = 1
+QSCHEME_PER_CHANNEL = 2
+
+
+def _bfloat16_to_float32(words):
+    """bfloat16 is the top half of a float32, widening is exact."""
+    return (words.view(np.uint16).astype(np.uint32) << 16).view(np.float32)
+
+@register(brine._custom_loaders)
+def _load_tensor(stream):
+    dtype_name = TENSOR_DTYPES[brine._load(stream)]
+    qscheme = brine._load(stream)
+    if qscheme == QSCHEME_PER_TENSOR:
+        scale = brine._load(stream)
+        zero_point = brine._load(stream)
+    elif qscheme == QSCHEME_PER_CHANNEL:
+        scales = brine._load(stream)
+        zero_points = brine._load(stream)
+        axis = brine._load(stream)
+    data = brine._load(stream)
+
+    if _brine_array_patch.tensor_format == "torch":
+        import torch
+        tensor = torch.from_numpy(data)
+        if dtype_name == "bfloat16":
+            return tensor.view(torch.bfloat16)
+        if dtype_name == "complex32":
+            return torch.view_as_complex(tensor.contiguous())
+        if qscheme == QSCHEME_PER_TENSOR:
+            return torch._make_per_tensor_quantized_tensor(tensor, scale, zero_point)
+        if qscheme == QSCHEME_PER_CHANNEL:
+            return torch._make_per_channel_quantized_tensor(
+                tensor, torch.from_numpy(scales), torch.from_numpy(zero_points), axis)
+        return tensor
+
+    # numpy has no bfloat16, complex32 or quantized types: widen them.
+    if dtype_name == "bfloat16":
+        return _bfloat16_to_float32(data)
+    if dtype_name == "complex32":
+        return np.ascontiguousarray(data, dtype=np.float32).view(np.complex64).reshape(data.shape[:-1])
+    if qscheme == QSCHEME_PER_TENSOR:
+        return (data.astype(np.float32) - zero_point) * np.float32(scale)
+    if qscheme == QSCHEME_PER_CHANNEL:
+        shape = [1] * data.ndim
+        shape[axis] = -1
+        return ((data.astype(np.float32) - zero_points.reshape(shape).astype(np.float32))
+                * scales.reshape(shape).astype(np.float32))
+    return data
@@ -1,66 +1,92 @@
-"""load/dump monkeypatch functions for pytorch tensors. Converts them to numpy arrays"""
+"""load/dump monkeypatch functions for pytorch tensors.
+
+Tensors are sent as their torch dtype plus a numpy view of their memory, so CPU tensors are not copied
+before being written out. bfloat16 has no numpy dtype, it travels as its raw 16 bit words, and complex32
+as float16 (real, imaginary) pairs. Quantized tensors send their integer representation and quantization
+parameters.
+
+The receiver builds a numpy array or a torch tensor, see _brine_array_patch.set_tensor_format().
+The loader lives in _brine_tensor_patch, which does not import torch, so a numpy receiver never does.
+"""
 from rpyc.core import brine
 try:
     from _brine_patch import register
     from _brine_array_patch import _dump_array
+    from _brine_tensor_patch import _load_tensor, TENSOR_DTYPE_CODES, QSCHEME_NONE, QSCHEME_PER_TENSOR, QSCHEME_PER_CHANNEL
 except ImportError:
     from ._brine_patch import register
     from ._brine_array_patch import _dump_array
+    from ._brine_tensor_patch import _load_tensor, TENSOR_DTYPE_CODES, QSCHEME_NONE, QSCHEME_PER_TENSOR, QSCHEME_PER_CHANNEL
 
 try:
     import torch
+except ImportError:
+    torch = None
 
-    # Annoyed that numpy removed a nice way of enumerating this
-    TORCH_INTEGER = [
-        torch.bool,
-        torch.uint8,
-        torch.uint16,
-        torch.uint32,
-        torch.uint64,
-        torch.int8,
-        torch.int16,
-        torch.int32,
-        torch.int64,
-        torch.quint8,
-        torch.qint8,
-        torch.qint32,
-        torch.quint4x2,
-    ]
-    TORCH_FLOAT = [
-        torch.float16,
-        torch.bfloat16,
-        torch.float32,
-        torch.float64,
-    ]
-    TORCH_COMPLEX = [
-        torch.complex32,
-        torch.complex64,
-        torch.complex128,
-    ]
+if torch is not None:
     TORCH_SIZE = [
         torch.Size
     ]
-    TORCH_TYPES = TORCH_INTEGER + TORCH_FLOAT + TORCH_COMPLEX + TORCH_SIZE
+
+    # Torch dtypes with a wire code. Others (quint4x2, float8...) go by netref.
+    DUMPABLE_DTYPES = {getattr(torch, name) for name in TENSOR_DTYPE_CODES if hasattr(torch, name)}
 
     @register(brine._custom_dumpable)
     def _dumpable_torch(obj):
-        return type(obj) in TORCH_TYPES or torch.is_tensor(obj)
+        if type(obj) in TORCH_SIZE:
+            return True
+        # Sparse, CSR and meta tensors have no plain memory to send, they go by netref.
+        return (torch.is_tensor(obj) and obj.layout == torch.strided and not obj.is_meta
+                and obj.dtype in DUMPABLE_DTYPES)
+    # Whether a tensor is dumpable depends on its layout and dtype, never cached as undumpable.
+    brine._volatile_dumpable.update((torch.Tensor, torch.nn.Parameter))
+
+    def _tensor_data(obj):
+        """numpy view of the tensor memory, and the torch dtype name. Copies only off-CPU tensors."""
+        obj = obj.detach()
+        if obj.device.type != "cpu":
+            obj = obj.cpu()
+        dtype_name = str(obj.dtype).rpartition(".")[2]
+        if obj.is_quantized:
+            # Integer representation, the quantization parameters are sent separately.
+            return obj.int_repr().numpy(), dtype_name
+        # Lazy conjugate/negative bits would make .numpy() fail.
+        obj = obj.resolve_conj().resolve_neg()
+        if obj.dtype == torch.bfloat16:
+            return obj.view(torch.int16).numpy(), dtype_name
+        if obj.dtype == torch.complex32:
+            # Real and imaginary parts as float16, shaped (..., 2).
+            return torch.view_as_real(obj).numpy(), dtype_name
+        # Non-contiguous tensors give strided views, _dump_array copies those once.
+        return obj.numpy(), dtype_name
+
+    def _dump_tensor(obj, stream):
+        data, dtype_name = _tensor_data(obj)
+        if dtype_name not in TENSOR_DTYPE_CODES:
+            raise TypeError(f"cannot dump tensor of dtype {obj.dtype}")
+        stream.append(brine.TAG_CUSTOM)
+        brine._dump_int(_load_tensor.id, stream)
+        brine._dump_int(TENSOR_DTYPE_CODES[dtype_name], stream)
+        if not obj.is_quantized:
+            brine._dump_int(QSCHEME_NONE, stream)
+        elif obj.qscheme() in (torch.per_tensor_affine, torch.per_tensor_symmetric):
+            brine._dump_int(QSCHEME_PER_TENSOR, stream)
+            brine._dump_float(float(obj.q_scale()), stream)
+            brine._dump_int(int(obj.q_zero_point()), stream)
+        else:
+            brine._dump_int(QSCHEME_PER_CHANNEL, stream)
+            _dump_array(obj.q_per_channel_scales().numpy(), stream)
+            _dump_array(obj.q_per_channel_zero_points().numpy(), stream)
+            brine._dump_int(int(obj.q_per_channel_axis()), stream)
+        _dump_array(data, stream)
 
     @register(brine._custom_dumpers)
     def _dump_torch(obj, stream):
         ret = True
         if torch.is_tensor(obj):
-            _dump_array(obj.detach().cpu().numpy(), stream)
+            _dump_tensor(obj, stream)
         elif type(obj) in TORCH_SIZE:
             brine._dump_tuple(obj, stream)
-        elif type(obj) in TORCH_INTEGER:
-            brine._dump_int(obj, stream)
-        elif type(obj) in TORCH_FLOAT:
-            brine._dump_float(obj, stream)
-        elif type(obj) in TORCH_COMPLEX:
-            brine._dump_complex(obj, stream)
         else:
             ret = False
         return ret
-except Exception as e:
-    print("Could not load tensor patches... perhaps pytorch is not installed?")
@@ -0,0 +1,273 @@
+"""Render many matplotlib figures in parallel, headless (Agg), one ServiceHost per core."""
+from collections import deque
+import gc
+import importlib
+import io
+import itertools
+import os
+import select
+
+import rpyc
+
+try:
+    from _plot_wrapper import WrapperService, ServiceHost
+except ImportError:
+    from ._plot_wrapper import WrapperService, ServiceHost
+
+# Jobs sent to a worker before the previous one finished, so it never idles waiting on the parent.
+WORKER_DEPTH = 2
+
+
+def job_name(job):
+    """"module:qualname" of a function, how jobs are named to the worker processes."""
+    if isinstance(job, str):
+        return job
+    return f"{job.__module__}:{job.__qualname__}"
+
+
+class FigureRenderer:
+    """Wrapped object in each farm worker. Builds one figure per job and saves it."""
+
+    def __init__(self, plt, gc_every=32):
+        self.plt = plt
+        self.gc_every = gc_every
+        self.jobs_done = 0
+        self._jobs = {}
+
+    def _resolve(self, name):
+        func = self._jobs.get(name)
+        if func is None:
+            module, _, qualname = name.partition(":")
+            func = importlib.import_module(module)
+            for attr in qualname.split("."):
+                func = getattr(func, attr)
+            self._jobs[name] = func
+        return func
+
+    def render(self, name, args, kwargs, format, path, savefig_kwargs):
+        """Run job(fig, *args, **kwargs) on a new figure. Returns the file path, or the encoded bytes."""
+        func = self._resolve(name)
+        # Dicts would arrive by reference, they are sent as tuples of items.
+        kwargs = dict(kwargs)
+        savefig_kwargs = dict(savefig_kwargs)
+        fig = self.plt.figure()
+        try:
+            func(fig, *args, **kwargs)
+            if path is not None:
+                fig.savefig(path, format=format, **savefig_kwargs)
+                return path
+            buf = io.BytesIO()
+            fig.savefig(buf, format=format, **savefig_kwargs)
+            return buf.getvalue()
+        finally:
+            # Also catches figures the job opened itself.
+            self.plt.close("all")
+            self.jobs_done += 1
+            if self.jobs_done % self.gc_every == 0:
+                # Figures hold reference cycles, freeing them promptly keeps worker memory flat.
+                gc.collect()
+
+
+class FigureWorker(ServiceHost):
+    """One farm process: matplotlib on the Agg backend, no window."""
+
+    def create_wrapper_service(self, **kwargs):
+        try:
+            import matplotlib
+            matplotlib.use("Agg", force=True)
+            import matplotlib.pyplot as plt
+        except ImportError:
+            print("Error import matplotlib... maybe it's not installed?")
+            return (-1, None)
+        return (0, WrapperService(FigureRenderer(plt, gc_every=kwargs.get("gc_every", 32))))
+
+    def preload_wrapper_service(self):
+        import matplotlib
+        matplotlib.use("Agg", force=True)
+        import matplotlib.pyplot
+
+    def reset_wrapper_service(self, vis_obj):
+        vis_obj.wrap_obj.plt.close("all")
+
+
+class _FarmWorker:
+    def __init__(self, host):
+        self.host = host
+        self.render = rpyc.async_(host.render)
+        # (job id, AsyncResult) in submission order.
+        self.in_flight = deque()
+        self.jobs_done = 0
+
+
+class FigureFarm:
+    """
+    Spread figure-building jobs over `workers` headless matplotlib processes.
+
+    A job is a module-level function `job(fig, *args, **kwargs)` that draws on a fresh Figure.
+    It runs in the worker, so it is sent by name, and its arguments should be dumpable
+    (numbers, strings, tuples, numpy arrays). Lists and other objects would be sent by reference
+    and read back from this process.
+
+    ```
+    def report_page(fig, data, title):
+        ax = fig.add_subplot()
+        ax.plot(data)
+        ax.set_title(title)
+
+    with FigureFarm(workers=8) as farm:
+        for job_id, png in farm.map(report_page, ((d, f"run {i}") for i, d in enumerate(runs))):
+            ...
+    ```
+    """
+
+    def __init__(self, workers=None, max_pending=None, max_jobs_per_worker=None, transport="unix", gc_every=32):
+        """
+        Parameters:
+        -------------------
+        workers:                int     Worker processes. None for one per core.
+
+        max_pending:            int     Jobs submitted but not yet collected, at most. submit() blocks
+                                        (and collects finished jobs) beyond that. None for 4 per worker.
+
+        max_jobs_per_worker:    int     Restart a worker process after this many jobs, in case a job leaks.
+                                        None for no limit.
+
+        transport:              str     ServiceHost transport of the workers.
+
+        gc_every:               int     Workers run the garbage collector after this many jobs.
+        """
+        self.n_workers = workers if workers is not None else os.cpu_count() or 1
+        self.max_pending = max_pending if max_pending is not None else 4 * self.n_workers
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.transport = transport
+        self.gc_every = gc_every
+        self.workers = []
+        # (job id, name, args, kwargs, format, path, savefig_kwargs) not yet sent to a worker.
+        self.queued = deque()
+        self.completed = deque()
+        self._ids = itertools.count()
+
+    def start(self):
+        for _ in range(self.n_workers):
+            self.workers.append(self._start_worker())
+        return 0
+
+    def _start_worker(self):
+        host = FigureWorker()
+        host.start(transport=self.transport, gc_every=self.gc_every)
+        return _FarmWorker(host)
+
+    def stop(self):
+        """Wait for submitted jobs (results stay available in `completed`) and stop the workers."""
+        while len(self.queued) > 0 or self._in_flight() > 0:
+            self._wait()
+        for worker in self.workers:
+            worker.host.stop()
+        self.workers.clear()
+
+    def pending(self):
+        """Jobs submitted whose result has not been collected yet."""
+        return len(self.queued) + self._in_flight() + len(self.completed)
+
+    def _in_flight(self):
+        return sum(len(worker.in_flight) for worker in self.workers)
+
+    def submit(self, job, *args, format="png", path=None, savefig_kwargs=None, **kwargs):
+        """Queue a job and return its id. Blocks while `max_pending` jobs are uncollected.
+
+        Parameters:
+        -------------------
+        job:            callable    job(fig, *args, **kwargs), or its "module:qualname".
+
+        format:         str         savefig format ("png", "svg", "pdf"...).
+
+        path:           str         Save to this file in the worker and return the path instead of the bytes.
+
+        savefig_kwargs: dict        Extra savefig arguments (dpi, bbox_inches...).
+        """
+        return self._submit(job, args, kwargs, format, path, None, savefig_kwargs)
+
+    def _submit(self, job, args, kwargs, format, path, path_format, savefig_kwargs):
+        while self.pending() >= self.max_pending:
+            if len(self.queued) == 0 and self._in_flight() == 0:
+                raise RuntimeError(f"{self.max_pending} results are waiting to be collected, "
+                                   "read them with as_completed() before submitting more")
+            self._wait()
+        job_id = next(self._ids)
+        if path_format is not None:
+            path = path_format.format(job_id)
+        self.queued.append((job_id, job_name(job), tuple(args), tuple(kwargs.items()), format, path,
+                            tuple((savefig_kwargs or {}).items())))
+        self._dispatch()
+        return job_id
+
+    def _dispatch(self):
+        for i, worker in enumerate(self.workers):
+            if self.max_jobs_per_worker is not None and worker.jobs_done >= self.max_jobs_per_worker:
+                if len(worker.in_flight) > 0:
+                    continue
+                worker.host.stop()
+                worker = self.workers[i] = self._start_worker()
+            while len(self.queued) > 0 and len(worker.in_flight) < WORKER_DEPTH:
+                if self.max_jobs_per_worker is not None and \
+                        worker.jobs_done + len(worker.in_flight) >= self.max_jobs_per_worker:
+                    break
+                job_id, *request = self.queued.popleft()
+                worker.in_flight.append((job_id, worker.render(*request)))
+
+    def _collect(self):
+        """Move finished jobs to `completed`, in the order each worker finished them."""
+        found = False
+        for worker in self.workers:
+            while len(worker.in_flight) > 0 and worker.in_flight[0][1].ready:
+                job_id, result = worker.in_flight.popleft()
+                worker.jobs_done += 1
+                self.completed.append((job_id, result))
+                found = True
+        return found
+
+    def _wait(self):
+        """Block until at least one job finishes, then send more work."""
+        self._dispatch()
+        while not self._collect():
+            busy = [worker.host for worker in self.workers if len(worker.in_flight) > 0]
+            if len(busy) == 0:
+                break
+            select.select(busy, [], [])
+        self._dispatch()
+
+    def as_completed(self):
+        """Yield (job id, result) for every submitted job as it finishes. Re-raises a job's exception."""
+        while self.pending() > 0:
+            if len(self.completed) == 0:
+                self._wait()
+                continue
+            job_id, result = self.completed.popleft()
+            yield job_id, result.value
+
+    def map(self, job, items, format="png", path_format=None, savefig_kwargs=None):
+        """Run job(fig, *item) for every item (a tuple of arguments) and yield (job id, result) as they finish.
+
+        Items are consumed lazily, so at most `max_pending` of them are in memory at once.
+
+        Parameters:
+        -------------------
+        path_format:    str     Save files instead of returning bytes, path_format.format(job_id).
+        """
+        for item in items:
+            while self.pending() >= self.max_pending:
+                # Room is made by handing results out, not by waiting for them to pile up.
+                if len(self.completed) == 0:
+                    self._wait()
+                    continue
+                job_id, result = self.completed.popleft()
+                yield job_id, result.value
+            self._submit(job, item, {}, format, None, path_format, savefig_kwargs)
+        yield from self.as_completed()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -1,3 +1,7 @@
+import weakref
+
+import numpy as np
+
 if __name__ == "__main__":
     from _plot_wrapper import WrapperService, AsyncWrapperService, ServiceHost
     import _brine_array_patch
@@ -6,6 +10,248 @@ else:
     from . import _brine_array_patch
 
 
+class _Series:
+    """Last `capacity` samples of a line. Every sample is written twice, at i and i + capacity,
+    so the samples in order are always the contiguous slice [start, start + count)."""
+
+    __slots__ = ["line", "capacity", "x", "y", "start", "count", "next_x"]
+
+    def __init__(self, line, capacity):
+        self.line = line
+        self.capacity = capacity
+        self.x = np.empty(2 * capacity)
+        self.y = np.empty(2 * capacity)
+        self.start = 0
+        self.count = 0
+        self.next_x = 0
+
+    def append(self, x, y):
+        capacity = self.capacity
+        n = len(y)
+        if n >= capacity:
+            x = x[-capacity:]
+            y = y[-capacity:]
+            self.x[:capacity] = self.x[capacity:] = x
+            self.y[:capacity] = self.y[capacity:] = y
+            self.start = 0
+            self.count = capacity
+            return
+        index = (self.start + self.count + np.arange(n)) % capacity
+        self.x[index] = self.x[index + capacity] = x
+        self.y[index] = self.y[index + capacity] = y
+        self.count += n
+        if self.count > capacity:
+            self.start = (self.start + self.count - capacity) % capacity
+            self.count = capacity
+
+    def data(self):
+        return self.x[self.start:self.start + self.count], self.y[self.start:self.start + self.count]
+
+
+def _remove_line(line):
+    # Already gone if its axes or figure were cleared.
+    if line.axes is not None and line in line.axes.lines:
+        line.remove()
+
+
+class SeriesPlotter:
+    """
+    Wraps pyplot in the child process with streaming line plots. A series keeps the last `capacity`
+    samples in the child, so only new samples are sent:
+
+    ```
+    plt.series("speed", capacity=1000)
+    while running:
+        plt.append("speed", v)                              # one sample, or an array of them
+        plt.append_many(("roll", "pitch"), (r, p))          # one request for several series
+    ```
+
+    Lines are updated with set_data() once per frame, not per append, and their axes rescaled.
+    With `animated` (blit mode) series lines are animated artists, and axes limits only grow, with
+    headroom, when samples fall outside them: every limit change costs a full redraw.
+    Everything else is forwarded to pyplot.
+    """
+
+    def __init__(self, plt, animated=False):
+        self.plt = plt
+        self.animated = animated
+        self.streams = {}
+        # Series appended to since the last flush.
+        self.dirty = set()
+
+    def __getattr__(self, name):
+        return getattr(self.plt, name)
+
+    def series(self, name, capacity=1000, **line_kwargs):
+        """Create a series plotted on the current axes, or move an existing one there (ex. after clf()).
+        line_kwargs go to plot() (color, label, linewidth...).
+        """
+        line_kwargs.setdefault("animated", self.animated)
+        line, = self.plt.plot([], [], **line_kwargs)
+        old = self.streams.get(name)
+        if old is not None:
+            _remove_line(old.line)
+        if old is not None and old.capacity == capacity:
+            old.line = line
+        else:
+            stream = self.streams[name] = _Series(line, capacity)
+            if old is not None:
+                # Keep the samples, up to the new capacity.
+                stream.append(*old.data())
+                stream.next_x = old.next_x
+        self.dirty.add(name)
+        return name
+
+    def append(self, name, y, x=None):
+        """Add samples to a series. y is a number or an array. x defaults to the sample count so far."""
+        stream = self.streams[name]
+        y = np.atleast_1d(np.asarray(y, dtype=np.float64))
+        if x is None:
+            x = np.arange(stream.next_x, stream.next_x + len(y), dtype=np.float64)
+        else:
+            x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+            if len(x) != len(y):
+                raise ValueError(f"series {name}: got {len(x)} x values for {len(y)} y values")
+        stream.next_x += len(y)
+        stream.append(x, y)
+        self.dirty.add(name)
+
+    def append_many(self, names, y, x=None):
+        """Add samples to several series in one request. y has one row per name: shape (len(names),)
+        for one sample each, or (len(names), samples). x, if given, is shared by all of them.
+        """
+        y = np.asarray(y, dtype=np.float64)
+        if len(y) != len(names):
+            raise ValueError(f"got {len(y)} rows of samples for {len(names)} series")
+        for name, row in zip(names, y):
+            self.append(name, row, x)
+
+    def remove_series(self, name):
+        stream = self.streams.pop(name)
+        self.dirty.discard(name)
+        _remove_line(stream.line)
+
+    def clear_series(self):
+        for name in list(self.streams):
+            self.remove_series(name)
+
+    def flush_series(self):
+        """Push appended samples to their lines and rescale their axes. Called before every frame."""
+        if len(self.dirty) == 0:
+            return
+        axes = set()
+        for name in self.dirty:
+            stream = self.streams[name]
+            stream.line.set_data(*stream.data())
+            if stream.line.axes is not None:
+                axes.add(stream.line.axes)
+        self.dirty.clear()
+        for ax in axes:
+            ax.relim()
+            if self.animated:
+                _grow_limits(ax)
+            else:
+                ax.autoscale_view()
+
+
+# Room left when limits grow in blit mode, as a fraction of the data range.
+X_HEADROOM = 0.5
+Y_HEADROOM = 0.1
+
+def _grow_limits(ax):
+    """Autoscale only if the data left the view, then leave headroom (ahead on x, both sides on y)."""
+    data = ax.dataLim
+    view = ax.viewLim
+    if not np.isfinite(data.bounds).all():
+        return
+    if view.x0 <= data.x0 and data.x1 <= view.x1 and view.y0 <= data.y0 and data.y1 <= view.y1:
+        return
+    ax.autoscale_view()
+    # auto=None keeps autoscaling on.
+    if ax.get_autoscalex_on() and ax.get_xscale() == "linear":
+        x0, x1 = ax.get_xlim()
+        ax.set_xlim(x0, x1 + (x1 - x0) * X_HEADROOM, auto=None)
+    if ax.get_autoscaley_on() and ax.get_yscale() == "linear":
+        y0, y1 = ax.get_ylim()
+        ax.set_ylim(y0 - (y1 - y0) * Y_HEADROOM, y1 + (y1 - y0) * Y_HEADROOM, auto=None)
+
+
+class _BlitState:
+    __slots__ = ["backgrounds", "size", "drawing"]
+
+    def __init__(self):
+        # axes -> background saved after the last full draw. None after the backend redrew on its own.
+        self.backgrounds = None
+        self.size = None
+        self.drawing = False
+
+
+class Blitter:
+    """Draws figures by blitting: the background of each axes (everything but animated artists) is saved
+    after a full draw, and later frames only restore it, draw the axes' animated artists and blit it.
+
+    Animated artists don't mark their figure stale, so a stale figure means something else changed
+    (limits, new artists, text...) and gets a full draw, as does a resized canvas.
+    Only axes with an animated artist changed since the last frame are redrawn.
+    """
+
+    def __init__(self):
+        self.figures = weakref.WeakKeyDictionary()
+        self.warned = False
+
+    def _state(self, canvas):
+        state = self.figures.get(canvas.figure)
+        if state is None:
+            state = self.figures[canvas.figure] = _BlitState()
+
+            def on_draw(event):
+                # The backend redrew the figure (window exposed, zoom...): the saved backgrounds are stale.
+                if not state.drawing:
+                    state.backgrounds = None
+            canvas.mpl_connect("draw_event", on_draw)
+        return state
+
+    @staticmethod
+    def _animated(ax):
+        artists = [artist for artist in ax.get_children() if artist.get_animated() and artist.get_visible()]
+        artists.sort(key=lambda artist: artist.get_zorder())
+        return artists
+
+    def draw(self, canvas):
+        figure = canvas.figure
+        if not canvas.supports_blit:
+            if not self.warned:
+                print(f"plot_wrapper: {type(canvas).__name__} can't blit, drawing full frames")
+                self.warned = True
+            for ax in figure.axes:
+                for artist in self._animated(ax):
+                    artist.set_animated(False)
+            if figure.stale:
+                canvas.draw()
+            return
+
+        state = self._state(canvas)
+        full = figure.stale or state.backgrounds is None or state.size != canvas.get_width_height()
+        if full:
+            state.drawing = True
+            try:
+                canvas.draw()
+            finally:
+                state.drawing = False
+            state.backgrounds = {ax: canvas.copy_from_bbox(ax.bbox) for ax in figure.axes}
+            state.size = canvas.get_width_height()
+
+        for ax in figure.axes:
+            artists = self._animated(ax)
+            if not full and not any(artist.stale for artist in artists):
+                continue
+            if not full:
+                canvas.restore_region(state.backgrounds[ax])
+            for artist in artists:
+                ax.draw_artist(artist)
+            canvas.blit(ax.bbox)
+
+
 class MatplotlibWrapper(ServiceHost):
     """
     Start matplotlib in a separate process, so opengl doesn't fight with other visualizers.
@@ -28,11 +274,16 @@ class MatplotlibWrapper(ServiceHost):
             import matplotlib.pyplot as plt
         except ImportError:
             print("Error import matplotlib... maybe it's not installed?")
-            port_val.value = -1
             return (-1, None)
 
         return (0, WrapperService(plt))
 
+    def preload_wrapper_service(self):
+        import matplotlib.pyplot
+
+    def reset_wrapper_service(self, vis_obj):
+        vis_obj.wrap_obj.close('all')
+
 class InteractiveMatplotlibWrapper(ServiceHost):
     """
     Start matplotlib in a separate process, so opengl doesn't fight with other visualizers.
@@ -49,6 +300,10 @@ class InteractiveMatplotlibWrapper(ServiceHost):
     ```
 
     Notably matplotlib is never imported in the parent process.
+
+    `start_recording(path)` records the active figure in the child, see FrameRecorder.
+    `start(blit=True)` redraws by blitting, see Blitter: only animated artists (streamed series,
+    or anything given animated=True) are redrawn each frame, over a background saved per axes.
     """
 
     def create_wrapper_service(self, **kwargs):
@@ -57,24 +312,42 @@ class InteractiveMatplotlibWrapper(ServiceHost):
             import matplotlib.pyplot as plt
         except ImportError:
             print("Error import matplotlib... maybe it's not installed?")
-            port_val.value = -1
             return (-1, None)
 
         plt.ion()
 
-        # Real spinrate is half this lol
-        # half spent on plot, half on polling the server
-        spinrate = kwargs.get("spinrate", 80)
+        options = {"spinrate": 40}
+        options.update((k, v) for k, v in kwargs.items() if k in AsyncWrapperService.SPIN_OPTIONS)
+        blitter = Blitter() if kwargs.get("blit", False) else None
+        plotter = SeriesPlotter(plt, animated=blitter is not None)
 
         def spin_mpl():
             """Helper function to poll for events from the open3d visualizer window."""
+            plotter.flush_series()
             figManager = matplotlib._pylab_helpers.Gcf.get_active()
             if figManager is not None:
                 canvas = figManager.canvas
-                if canvas.figure.stale:
+                if blitter is not None:
+                    blitter.draw(canvas)
+                elif canvas.figure.stale:
                     canvas.draw()
-                canvas.start_event_loop(1/spinrate)
-        return (0, AsyncWrapperService(plt, spin_mpl, spinrate=spinrate))
+                # Handle pending GUI events without blocking, the service decides when the next frame is.
+                canvas.flush_events()
+
+        def capture_mpl():
+            """Copy of the active figure as last drawn, RGBA. Agg based canvases only."""
+            figManager = matplotlib._pylab_helpers.Gcf.get_active()
+            if figManager is None:
+                return None
+            return np.array(figManager.canvas.buffer_rgba())
+        return (0, AsyncWrapperService(plotter, spin_mpl, capture_func=capture_mpl, **options))
+
+    def preload_wrapper_service(self):
+        import matplotlib.pyplot
+
+    def reset_wrapper_service(self, vis_obj):
+        vis_obj.wrap_obj.clear_series()
+        vis_obj.wrap_obj.close('all')
 
 
 if __name__ == "__main__":
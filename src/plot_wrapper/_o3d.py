@@ -3,10 +3,102 @@ import rpyc
 
 if __name__ == "__main__":
     from _plot_wrapper import AsyncWrapperService, ServiceHost
-    import _brine_o3d_patch
 else:
     from ._plot_wrapper import AsyncWrapperService, ServiceHost
-    from . import _brine_o3d_patch
+
+
+# Per-vertex buffers, by the attribute name each geometry type uses for them.
+VERTEX_BUFFERS = ("vertices", "points")
+COLOR_BUFFERS = ("vertex_colors", "colors")
+NORMAL_BUFFERS = ("vertex_normals", "normals")
+
+
+class GeometryRegistry:
+    """
+    Wraps an open3d Visualizer in the child process. add_geometry returns a handle (int),
+    and the geometry can then be changed in place without sending it again:
+
+    ```
+    handle = vis.add_geometry(mesh)
+    vis.update_vertices(handle, new_vertices)   # one array instead of the whole mesh
+    vis.set_pose(handle, transform)             # 4x4, 128 bytes
+    ```
+
+    Everything else is forwarded to the Visualizer.
+    """
+
+    def __init__(self, vis):
+        self.vis = vis
+        # handle -> [geometry, current pose (4x4) or None for identity]
+        self.geometries = {}
+        self._next_handle = 1
+
+    def __getattr__(self, name):
+        return getattr(self.vis, name)
+
+    def add_geometry(self, geometry, reset_bounding_box=True):
+        """Add a geometry and return its handle. False if open3d refused it."""
+        if not self.vis.add_geometry(geometry, reset_bounding_box):
+            return False
+        # Start at 1 so a handle is always truthy, like the bool add_geometry used to return.
+        handle = self._next_handle
+        self._next_handle += 1
+        self.geometries[handle] = [geometry, None]
+        return handle
+
+    def remove_geometry(self, geometry, reset_bounding_box=True):
+        """Remove a geometry by handle, or by the geometry itself as Visualizer.remove_geometry does."""
+        if type(geometry) is int:
+            geometry, _ = self.geometries.pop(geometry)
+        else:
+            for handle, entry in list(self.geometries.items()):
+                if entry[0] is geometry:
+                    del self.geometries[handle]
+        return self.vis.remove_geometry(geometry, reset_bounding_box)
+
+    def clear_geometries(self):
+        self.geometries.clear()
+        return self.vis.clear_geometries()
+
+    def _set_buffer(self, handle, names, array, rotate=False, translate=False):
+        import open3d as o3d
+        geometry, pose = self.geometries[handle]
+        name = next((name for name in names if hasattr(geometry, name)), None)
+        if name is None:
+            raise TypeError(f"{type(geometry).__name__} has none of {names}")
+        array = np.asarray(array, dtype=np.float64)
+        if pose is not None and (rotate or translate):
+            # Updates are given in the geometry's own frame, keep the pose set by set_pose.
+            array = array @ pose[:3, :3].T
+            if translate:
+                array += pose[:3, 3]
+        setattr(geometry, name, o3d.utility.Vector3dVector(np.ascontiguousarray(array)))
+        return self.vis.update_geometry(geometry)
+
+    def update_vertices(self, handle, vertices):
+        """Replace the vertices (points for point clouds and line sets). Shape (N, 3)."""
+        return self._set_buffer(handle, VERTEX_BUFFERS, vertices, rotate=True, translate=True)
+
+    def update_colors(self, handle, colors):
+        """Replace the per-vertex (per-point, per-line) colors. Shape (N, 3), values in [0, 1]."""
+        return self._set_buffer(handle, COLOR_BUFFERS, colors)
+
+    def update_normals(self, handle, normals):
+        """Replace the per-vertex (per-point) normals. Shape (N, 3)."""
+        return self._set_buffer(handle, NORMAL_BUFFERS, normals, rotate=True)
+
+    def set_pose(self, handle, pose):
+        """Place the geometry with a 4x4 transform, relative to how it was added (not to the last pose)."""
+        entry = self.geometries[handle]
+        geometry, current = entry
+        pose = np.asarray(pose, dtype=np.float64)
+        if current is None:
+            delta = pose
+        else:
+            delta = pose @ np.linalg.inv(current)
+        geometry.transform(delta)
+        entry[1] = pose
+        return self.vis.update_geometry(geometry)
 
 
 class O3dVisWrapper(ServiceHost):
@@ -15,6 +107,8 @@ class O3dVisWrapper(ServiceHost):
     so opengl doesn't fight with other visualizers.
 
     Notably open3d is never imported in the parent process.
+
+    `start_recording(path)` records the window in the child, see FrameRecorder.
     """
 
     def create_wrapper_service(self, **kwargs):
@@ -24,7 +118,6 @@ class O3dVisWrapper(ServiceHost):
             vis.create_window()
         except ImportError:
             print("Error import open3d... maybe it's not installed?")
-            port_val.value = -1
             return (-1, None)
 
         def spin_o3d():
@@ -32,8 +125,19 @@ class O3dVisWrapper(ServiceHost):
             vis.poll_events()
             vis.update_renderer()
 
-        spinrate = kwargs.get("spinrate", 20)
-        return (0, AsyncWrapperService(vis, spin_o3d, spinrate=spinrate))
+        def capture_o3d():
+            """Framebuffer as rendered by spin_o3d, float RGB in [0, 1]."""
+            return np.asarray(vis.capture_screen_float_buffer(do_render=False))
+
+        options = {"spinrate": 20}
+        options.update((k, v) for k, v in kwargs.items() if k in AsyncWrapperService.SPIN_OPTIONS)
+        return (0, AsyncWrapperService(GeometryRegistry(vis), spin_o3d, capture_func=capture_o3d, **options))
+
+    def preload_wrapper_service(self):
+        import open3d
+
+    def reset_wrapper_service(self, vis_obj):
+        vis_obj.wrap_obj.destroy_window()
 
 if __name__ == "__main__":
     vis = O3dVisWrapper()
@@ -50,15 +154,13 @@ if __name__ == "__main__":
 
     mesh.triangles = o3d.utility.Vector3iVector(np_triangles)
 
-    vis.add_geometry(mesh)
+    handle = vis.add_geometry(mesh)
 
     #vis.spin()
     for i in range(10):
         print(i)
         input()
         np_vertices += [0.0, 0.0, 0.1]
-        mesh.vertices = o3d.utility.Vector3dVector(np_vertices)
-
-        vis.clear_geometries()
-        vis.add_geometry(mesh, reset_bounding_box=False)
+        # Only the vertex array is sent, the mesh stays in the wrapper process.
+        vis.update_vertices(handle, np_vertices)
     vis.stop()
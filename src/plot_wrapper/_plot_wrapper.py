@@ -1,8 +1,60 @@
+from collections import OrderedDict, deque
+import itertools
 import multiprocessing as mp
+import os
+import select
+import shutil
+import socket
+import sys
+import tempfile
+import threading
 import time
+import traceback
 
 import numpy as np
 import rpyc
+from rpyc.core import netref
+
+try:
+    from _brine_batch_patch import BatchRef
+    from _array_codec import disable_channel_compression, connection_cache, current_cache
+    from _recorder import FrameRecorder
+    from _shared_memory import SharedMemoryPool
+    import _stats
+except ImportError:
+    from ._brine_batch_patch import BatchRef
+    from ._array_codec import disable_channel_compression, connection_cache, current_cache
+    from ._recorder import FrameRecorder
+    from ._shared_memory import SharedMemoryPool
+    from . import _stats
+
+# Operations recorded by Batch, executed in order by WrapperService.exposed_run_batch.
+# Each op is (code, target, a, b). target is the index of an earlier result, or -1 for the wrapped object.
+OP_GETATTR = 0  # a = attribute name
+OP_CALL = 1     # a = args, b = kwargs as (key, value) pairs
+OP_GETITEM = 2  # a = key
+
+# How ServiceHost talks to its child process.
+#   "tcp":          rpyc server on a localhost port.
+#   "unix":         rpyc server on a unix domain socket in a private temp directory.
+#   "socketpair":   socket.socketpair() created before forking, no server or listening socket at all.
+TRANSPORTS = ("tcp", "unix", "socketpair")
+
+PROTOCOL_CONFIG = {'allow_all_attrs': True}
+
+# root.<SERVICE_PREFIX><name> reaches WrapperService.exposed_<name>. Names without it are looked up on the
+# wrapped object, so service calls like stats() never hide a wrapped attribute of the same name.
+SERVICE_PREFIX = "_plot_wrapper_"
+
+
+def _report(ready_conn, *msg):
+    """Send a startup message to the parent. It stops listening once the wrapper is ready."""
+    if ready_conn is None:
+        return
+    try:
+        ready_conn.send(msg)
+    except (OSError, EOFError):
+        pass
 
 class WrapperService(rpyc.Service):
     """RPyC service that simply forwards all calls to an object.
@@ -17,10 +69,21 @@ class WrapperService(rpyc.Service):
         """
         self.wrap_obj = wrap_obj
         self.server = None
+        self.conn = None
+        # ClientMux when serving several clients (AsyncWrapperService over tcp/unix).
+        self.mux = None
         self.server_class = server_class
+        # ArrayCodec for the connection, set by ServiceHost before serving.
+        self.array_codec = None
+        # SharedMemoryPool for the owner's connection, set by ServiceHost before serving.
+        self.shm_pool = None
+        # Keep accepting clients after the owner, set by ServiceHost before serving.
+        self.multi_client = False
 
     def on_connect(self, conn):
-        pass
+        self.conn = conn
+        disable_channel_compression(conn)
+        _stats.instrument(conn)
 
     def on_disconnect(self, conn):
         pass
@@ -30,32 +93,141 @@ class WrapperService(rpyc.Service):
         pass
     
     def exposed_stop(self):
-        self.server.close()
+        if self.server is not None:
+            self.server.close()
+        elif self.conn is not None:
+            # socketpair transport, there is no server. Closing the connection ends serving.
+            self.conn.close()
+
+    def exposed_stats(self, reset=False):
+        """Snapshot of this process's counters and histograms, see _stats.snapshot()."""
+        snapshot = _stats.snapshot()
+        if reset:
+            _stats.reset()
+        return snapshot
+
+    def exposed_enable_stats(self, enabled=True):
+        conns = self.mux.connections if self.mux is not None else (self.conn,)
+        if enabled:
+            _stats.enable(conns)
+        else:
+            _stats.disable(conns)
+
+    def exposed_array_cache(self, peer_has_cache):
+        """The calling client announces whether it keeps the arrays sent to it as digests.
+        Returns whether this side does, for that connection.
+        """
+        cache = current_cache()
+        if cache is None:
+            return False
+        cache.peer_has_cache = peer_has_cache
+        return True
+
+    def exposed_clients(self):
+        """Per client counters, see ClientMux.client_stats(). Empty unless several clients can connect."""
+        if self.mux is None:
+            return ()
+        return self.mux.client_stats()
+
+    def exposed_run_batch(self, ops, keep_results=False):
+        """Run calls recorded by a Batch in order, in one request.
+
+        Returns the result of every op if keep_results is set, otherwise None.
+        """
+        results = []
+        def resolve(arg):
+            if type(arg) is BatchRef:
+                return results[arg.index]
+            if type(arg) is tuple:
+                return tuple(resolve(item) for item in arg)
+            return arg
+
+        for code, target, a, b in ops:
+            if target < 0:
+                if code == OP_GETATTR:
+                    results.append(self._rpyc_getattr(a))
+                    continue
+                obj = self.wrap_obj
+            else:
+                obj = results[target]
+            if code == OP_GETATTR:
+                results.append(getattr(obj, a))
+            elif code == OP_CALL:
+                results.append(obj(*resolve(a), **{key: resolve(value) for key, value in b}))
+            elif code == OP_GETITEM:
+                results.append(obj[resolve(a)])
+            else:
+                raise ValueError(f"unknown batch op {code}")
+        if keep_results:
+            return tuple(results)
+        return None
 
     def _rpyc_getattr(self, name):
+        if name.startswith(SERVICE_PREFIX):
+            return getattr(self, "exposed_" + name[len(SERVICE_PREFIX):])
         if name == "stop":
             return self.exposed_stop
+        if name == "run_batch":
+            return self.exposed_run_batch
         return getattr(self.wrap_obj, name)
 
-    def start_server(self, port_val=None, requested_port=0):
+    def _protocol_config(self):
+        config = dict(PROTOCOL_CONFIG)
+        if self.array_codec is not None:
+            config["array_codec"] = self.array_codec
+        if self.shm_pool is not None:
+            config["shm_pool"] = self.shm_pool
+        return config
+
+    def _make_server(self, requested_port=0, socket_path=None):
+        if socket_path is not None:
+            server = self.server_class(self, socket_path=socket_path, protocol_config=self._protocol_config())
+        else:
+            # Default port = 0 means pick a port for me. Loopback only, the wrapper allows all attributes.
+            server = self.server_class(self, hostname="127.0.0.1", port=requested_port,
+                                       protocol_config=self._protocol_config())
+            # Inherited by accepted sockets, see ServiceHost._connect.
+            server.listener.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server = server
+        return server
+
+    def _connect_socket(self, sock):
+        """Serve an already connected socket (socketpair transport) without a server."""
+        from rpyc.core import SocketStream, Channel
+        config = dict(self._protocol_config(), credentials=None, endpoints=(None, None))
+        self.conn = self._connect(Channel(SocketStream(sock)), config)
+        return self.conn
+
+    def start_server(self, ready_conn=None, requested_port=0, socket_path=None, sock=None):
         """Spin up the rpyc server.
 
         Parameters:
         ------------------------------
-        port_val:   Shared memory that we need to report the server port back to.
+        ready_conn:     Pipe end to send ("ready", port) to once clients can connect.
+
+        requested_port: TCP port to listen on. 0 picks a free one.
+
+        socket_path:    Listen on this unix domain socket instead of TCP.
+
+        sock:           Connected socket from socket.socketpair(). Served directly, without a server.
         """
-        # Default port = 0 means pick a port for me.
-        server = self.server_class(self, port=requested_port, protocol_config={'allow_all_attrs': True})
-        self.server = server
+        if sock is not None:
+            conn = self._connect_socket(sock)
+            _report(ready_conn, "ready", None)
+            try:
+                conn.serve_all()
+            except KeyboardInterrupt:
+                return True
+            return False
 
-        if port_val is not None:
-            # Communicate the assigned port back via shared memory.
-            port_val.value = server.port
+        server = self._make_server(requested_port, socket_path)
 
         # Copied from rpyc server implementation.
         # https://github.com/tomerfiliba-org/rpyc/blob/master/rpyc/utils/server.py#L258
         server._listen()
         server._register()
+        # Only report once listening, connecting earlier is refused.
+        _report(ready_conn, "ready", server.port)
 
         interrupted = False
         try:
@@ -78,9 +250,16 @@ class AsyncWrapperService(WrapperService):
         while listening for server events.
     Useful for "objects" that should be handled asynchronously, like
         Open3D Visualizer windows or Matplotlib interactive sessions.
+
+    Frames are drawn on a deadline: requests are served until the next frame is due (or a per frame
+    cap is hit), so a steady stream of requests can't stop the window from redrawing.
+    While no requests come in, frames slow down to `idle_spinrate`.
     """
 
-    def __init__(self, wrap_obj, spin_func, spinrate=20, server_class=rpyc.utils.server.OneShotServer):
+    SPIN_OPTIONS = ("spinrate", "idle_spinrate", "max_serve_time", "max_messages")
+
+    def __init__(self, wrap_obj, spin_func, spinrate=20, server_class=rpyc.utils.server.OneShotServer,
+                 idle_spinrate=None, max_serve_time=None, max_messages=None, capture_func=None):
         """
         Parameters:
         -------------------
@@ -89,47 +268,382 @@ class AsyncWrapperService(WrapperService):
         spin_func:      callable()          Callback for updating visualizer.
 
         spinrate:       Float               FPS to spin at
+
+        idle_spinrate:  Float               FPS to spin at while no requests are coming in.
+                                            Defaults to spinrate (windows keep handling input events).
+
+        max_serve_time: Float               Most seconds spent serving requests between two frames.
+                                            Defaults to until the next frame is due.
+
+        max_messages:   int                 Most requests served between two frames, the next frame is drawn
+                                            early once this many are served. Defaults to no limit.
+
+        capture_func:   callable()          Returns the frame just drawn as an array (H, W, 3 or 4), uint8
+                                            or float in [0, 1], or None. Needed for start_recording().
         """
         super().__init__(wrap_obj, server_class=server_class)
         self.spin_func = spin_func
         self.dt = 1 / spinrate
+        self.idle_dt = self.dt if idle_spinrate is None else 1 / idle_spinrate
+        self.max_serve_time = max_serve_time
+        self.max_messages = max_messages
         self.active = False
+        self.frames = 0
+        self.frame_rate = 0.0
+        self.capture_func = capture_func
+        self.recorder = None
+
+    def exposed_start_recording(self, path, fps=None, command=None, max_queue=4):
+        """Record the frames drawn from now on, written from a background thread in this process.
+        See FrameRecorder for path and command. fps defaults to the spin rate.
+        """
+        if self.capture_func is None:
+            raise ValueError(f"{type(self.wrap_obj).__name__} wrapper can't capture frames")
+        self.exposed_stop_recording()
+        if command is not None:
+            # A list from the client is a netref, the writer thread can't iterate it while this thread spins.
+            command = tuple(rpyc.classic.obtain(command))
+        self.recorder = FrameRecorder(path, fps=fps or 1 / self.dt, command=command, max_queue=max_queue)
+
+    def exposed_stop_recording(self):
+        """Finish writing. Returns (frames written, frames skipped), None if not recording."""
+        recorder, self.recorder = self.recorder, None
+        if recorder is None:
+            return None
+        return recorder.stop()
+
+    def exposed_frame_rate(self):
+        """Frames per second achieved over the last second, and the number of frames drawn so far."""
+        return (self.frame_rate, self.frames)
 
     def wrapper_spin(self):
         """Update visualizer window here."""
         self.spin_func()
-    
+
     def spin(self, conn):
-        """Listen for server events and update visualizer window in the same thread."""
+        """Listen for server events and update visualizer window in the same thread.
+
+        conn is the Connection, or a ClientMux serving several of them.
+        """
         self.active = True
+        if isinstance(conn, ClientMux):
+            self.mux = conn
+        clock = time.perf_counter
+        next_frame = clock()
+        rate_start, rate_frames = next_frame, self.frames
+        busy = True
         while self.active:
+            timed = _stats.enabled
+            start = clock()
             self.wrapper_spin()
+            if self.recorder is not None:
+                self.recorder.capture(self.capture_func)
+            frame_end = clock()
+            self.frames += 1
+            if frame_end - rate_start >= 1:
+                self.frame_rate = (self.frames - rate_frames) / (frame_end - rate_start)
+                rate_start, rate_frames = frame_end, self.frames
+            if timed:
+                _stats.observe_time("spin.frame", frame_end - start)
+
+            # Skip frames that are already late rather than drawing them back to back.
+            next_frame = max(next_frame + (self.dt if busy else self.idle_dt), start)
+            # If drawing takes longer than a frame, still serve for as long as the frame took.
+            serve_until = max(next_frame, frame_end + (frame_end - start))
+            if self.max_serve_time is not None:
+                serve_until = min(serve_until, frame_end + self.max_serve_time)
+            served = 0
             try:
-                res = True
-                while res:
-                    res = conn.poll(timeout=self.dt)
+                # Always take one request if there is one, even when the frame ran late.
+                while conn.poll(timeout=max(0, serve_until - clock())):
+                    served += 1
+                    if not busy:
+                        # Requests after an idle period are drawn at the full frame rate.
+                        busy = True
+                        next_frame = min(next_frame, start + self.dt)
+                        serve_until = min(serve_until, max(next_frame, frame_end + (frame_end - start)))
+                    if served == self.max_messages or clock() >= serve_until:
+                        break
             except EOFError:
                 break
+            busy = served > 0
+            if timed:
+                # Requests handled between two frames, and how long that took (including the idle wait).
+                _stats.observe("spin.backlog", served)
+                _stats.observe_time("spin.serve", clock() - frame_end)
 
-    def start_server(self, port_val=None, requested_port=0):
-        # Default port = 0 means pick a port for me.
-        server = self.server_class(self, port=requested_port, protocol_config={'allow_all_attrs': True})
-        self.server = server
+    def start_server(self, ready_conn=None, requested_port=0, socket_path=None, sock=None):
+        if sock is not None:
+            conn = self._connect_socket(sock)
+            _report(ready_conn, "ready", None)
+            interrupted = False
+            try:
+                self.spin(conn)
+            except KeyboardInterrupt:
+                interrupted = True
+            finally:
+                self.active = False
+                # Unfinished recordings are still written out.
+                self.exposed_stop_recording()
+                conn.close()
+                return interrupted
 
-        if port_val is not None:
-            # Communicate the assigned port back via shared memory.
-            port_val.value = server.port
+        server = self._make_server(requested_port, socket_path)
 
         try:
-            interrupted = spin_server_singlethread(server, self.spin)
+            interrupted = spin_server_singlethread(server, self.spin,
+                                                   on_listen=lambda: _report(ready_conn, "ready", server.port),
+                                                   multi_client=self.multi_client)
         finally:
             self.active = False
+            self.exposed_stop_recording()
             return interrupted
 
 
+class BatchHandle:
+    """Placeholder for the result of a call recorded in a Batch.
+
+    Attribute access, calls and indexing on it are recorded too,
+    and it can be passed as an argument (or inside a tuple) to later calls in the same batch.
+    """
+
+    def __init__(self, batch, index):
+        object.__setattr__(self, "_batch", batch)
+        object.__setattr__(self, "_index", index)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self._batch._record(OP_GETATTR, self._index, name, None)
+
+    def __call__(self, *args, **kwargs):
+        return self._batch._record(OP_CALL, self._index, args, kwargs)
+
+    def __getitem__(self, key):
+        return self._batch._record(OP_GETITEM, self._index, key, None)
+
+    def __iter__(self):
+        # Length is unknown until the batch runs. Without this python would iterate with __getitem__ forever.
+        raise TypeError("Batch handles can't be unpacked, index them instead (fig = handle[0])")
+
+    def __setattr__(self, name, value):
+        raise TypeError("Batch handles are read only, call a setter method instead")
+
+    def __repr__(self):
+        return f"<BatchHandle {self._index}>"
+
+
+class Batch:
+    """Records calls made through a ServiceHost and sends them as one request.
+
+    ```
+    with plt.batch() as batch:
+        plt.clf()
+        line = plt.plot(x, y)
+        ax = plt.gca()
+        ax.set_xlim(0, 10)
+    print(batch.result(line))  # only with batch(keep_results=True)
+    ```
+    """
+
+    def __init__(self, host, keep_results=False):
+        self.host = host
+        self.keep_results = keep_results
+        self.ops = []
+        self.results = None
+
+    def _record(self, code, target, a, b):
+        if code == OP_CALL:
+            a = self._to_ref(a)
+            b = tuple((key, self._to_ref(value)) for key, value in b.items())
+        elif code == OP_GETITEM:
+            a = self._to_ref(a)
+        self.ops.append((code, target, a, b))
+        return BatchHandle(self, len(self.ops) - 1)
+
+    def _to_ref(self, arg):
+        if type(arg) is BatchHandle:
+            if arg._batch is not self:
+                raise ValueError("Batch handles can only be used inside the batch that created them")
+            return BatchRef(arg._index)
+        if type(arg) is tuple:
+            return tuple(self._to_ref(item) for item in arg)
+        return arg
+
+    def getattr(self, name):
+        return self._record(OP_GETATTR, -1, name, None)
+
+    def result(self, handle):
+        """Result of a recorded call, after the batch has run."""
+        if self.results is None:
+            raise RuntimeError("Batch results are only available after the batch runs with keep_results=True")
+        return self.results[handle._index]
+
+    def __enter__(self):
+        self.host._begin_batch(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.host._end_batch(self)
+        if exc_type is None and len(self.ops) > 0:
+            self.results = self.host._run_batch(tuple(self.ops), self.keep_results)
+
+
+class UpdateChannel:
+    """Fire-and-forget updates with a bounded number of requests in flight.
+
+    Each update is a frame of calls recorded like a Batch. At most `window` frames are sent but not
+    yet finished by the wrapper. Frames beyond that wait in a bounded pending queue, handled by `policy`:
+        "latest":       A new frame replaces the pending frame with the same key (one pending frame per key).
+        "drop_oldest":  The oldest pending frame is dropped once `max_pending` frames are waiting.
+        "block":        Wait for the oldest frame in flight to finish before sending.
+
+    A pending frame goes out as soon as the reply of a frame in flight is served: by any later call
+    through the host, `flush()`, or a thread serving the connection (rpyc.BgServingThread).
+
+    ```
+    channel = plt.update_channel(window=2, policy="latest")
+    while running:
+        with channel.frame(key="line"):
+            plt.clf()
+            plt.plot(x_history)
+    channel.flush()
+    ```
+    """
+
+    POLICIES = ("latest", "drop_oldest", "block")
+
+    def __init__(self, host, window=2, policy="latest", max_pending=8):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown update policy {policy}, expected one of {self.POLICIES}")
+        self.host = host
+        self.window = window
+        self.policy = policy
+        self.max_pending = max_pending
+        self.in_flight = deque()
+        self.pending = OrderedDict()
+        self.sent = 0
+        self.dropped = 0
+        self._unique_keys = itertools.count()
+        # Held while pumping. Set _repump before trying to take it, whoever holds it pumps again.
+        self._lock = threading.Lock()
+        self._repump = False
+
+    def frame(self, key=None):
+        """Record the calls in a `with` block as one update. Frames with the same key replace each other."""
+        return _ChannelFrame(self, key)
+
+    def submit(self, ops, key=None):
+        """Queue recorded ops and send as many frames as the window allows, without waiting."""
+        if self.policy != "latest" or key is None:
+            key = ("_unique", next(self._unique_keys))
+        with self._lock:
+            if key in self.pending:
+                del self.pending[key]
+                self.dropped += 1
+            elif self.policy != "block" and len(self.pending) >= self.max_pending:
+                self.pending.popitem(last=False)
+                self.dropped += 1
+            self.pending[key] = ops
+        self.pump(block=self.policy == "block")
+
+    def pump(self, block=False):
+        """Retire finished frames and send pending ones while there is room in the window.
+
+        Raises the remote exception of a frame that failed.
+        """
+        self._locked_pump(block, True)
+
+    def _completed(self, result):
+        # Completion callback of frames in flight, runs wherever the reply is served.
+        # Failed frames stay in flight, the next pump() outside of a callback raises their error.
+        self._locked_pump(False, False)
+
+    def _locked_pump(self, block, raise_errors):
+        # A pump that finds another one running (another thread, or a reply served inside
+        # wait() or ready) leaves the work to it.
+        self._repump = True
+        if not self._lock.acquire(blocking=block):
+            return
+        while True:
+            try:
+                self._repump = False
+                self._pump(block, raise_errors)
+            finally:
+                self._lock.release()
+            if not self._repump or not self._lock.acquire(blocking=False):
+                return
+
+    def _pump(self, block, raise_errors):
+        while len(self.in_flight) > 0 and self.in_flight[0].ready:
+            if self.in_flight[0].error and not raise_errors:
+                break
+            self._retire(self.in_flight.popleft())
+        while len(self.pending) > 0:
+            if len(self.in_flight) >= self.window:
+                if not block:
+                    return
+                result = self.in_flight.popleft()
+                result.wait()
+                self._retire(result)
+                continue
+            _, ops = self.pending.popitem(last=False)
+            result = self.host._run_batch_async(ops)
+            self.in_flight.append(result)
+            self.sent += 1
+            result.add_callback(self._completed)
+
+    def flush(self):
+        """Send every pending frame and wait until the wrapper has run all of them."""
+        with self._lock:
+            self._pump(True, True)
+            while len(self.in_flight) > 0:
+                result = self.in_flight.popleft()
+                result.wait()
+                self._retire(result)
+        # Frames submitted by another thread meanwhile.
+        if self._repump:
+            self.pump()
+
+    @staticmethod
+    def _retire(result):
+        if result.error:
+            # Raises the remote exception.
+            result.value
+
+
+class _ChannelFrame(Batch):
+    """Batch that hands its ops to an UpdateChannel instead of running them."""
+
+    def __init__(self, channel, key):
+        super().__init__(channel.host)
+        self.channel = channel
+        self.key = key
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.host._end_batch(self)
+        if exc_type is None and len(self.ops) > 0:
+            self.channel.submit(tuple(self.ops), self.key)
+
+
 class ServiceHost:
     """Class that handles multiprocessing and server setup logic."""
 
+    # Set while a `with host.batch():` block is recording.
+    __batch = None
+    __run_batch = None
+    __run_batch_async = None
+    __worker = None
+    __server_proc = None
+    # name -> netref resolved on the wrapper, saves a round trip per call. None when disabled.
+    __proxies = None
+    # Attributes that are looked up on every access, for ones the wrapper may rebind.
+    uncached_attributes = frozenset()
+    # Where other processes can attach() to the wrapper: socket path ("unix") or (host, port) ("tcp").
+    address = None
+    # ids of the hosts recording stats. Recording is process-wide, it stops once none of them does.
+    _stats_hosts = set()
+
     def create_wrapper_service(self, **kwargs):
         """Return a WrapperService (or AsyncWrapperService) customized to your visualizer.
         
@@ -137,47 +651,451 @@ class ServiceHost:
         """
         return None
 
-    def start(self, sleep_dt=1, **kwargs):
-        """
-        Spawn the o3d visualizer-running process. Uses rpyc to do communication.
+    def preload_wrapper_service(self):
+        """Import heavy libraries ahead of time. Runs in idle WarmPool workers, before any start()."""
+        pass
+
+    def reset_wrapper_service(self, vis_obj):
+        """Undo the state a session left in a WarmPool worker (close figures, destroy windows...)."""
+        pass
+
+    def _serve_wrapper(self, ready_conn, kwargs, socket_path=None, sock=None, reset=False, codec=None, stats=False,
+                       multi_client=False, shm=None):
+        """Child side of start(): create the wrapper service and serve it until stopped.
+
+        shm is (threshold, max_segments) of the shared memory pool for the owner's connection, or None.
         """
-        self.__client = None
-        def spawn_wrapper(port_val):
+        try:
             # Janky way to pass the server object to the service after it's created.
+            init_start = time.perf_counter()
             error, vis_obj = self.create_wrapper_service(**kwargs)
             if error != 0:
+                _report(ready_conn, "error", f"create_wrapper_service returned error {error}")
                 return error
+            _report(ready_conn, "init", time.perf_counter() - init_start)
+            vis_obj.array_codec = codec
+            vis_obj.multi_client = multi_client
+            if stats:
+                _stats.enable()
+            if shm is not None:
+                vis_obj.shm_pool = SharedMemoryPool(*shm)
 
-            vis_obj.start_server(port_val)
+            try:
+                vis_obj.start_server(ready_conn, socket_path=socket_path, sock=sock)
+            finally:
+                if vis_obj.shm_pool is not None:
+                    # Unlinks the segments this process wrote into.
+                    vis_obj.shm_pool.close()
+                    vis_obj.shm_pool = None
+            if reset:
+                self.reset_wrapper_service(vis_obj)
             return 0
+        except Exception:
+            # Ignored by the parent if it is already connected.
+            _report(ready_conn, "error", traceback.format_exc())
+            raise
+
+    @staticmethod
+    def _process_options(shared_memory=False, shm_threshold=1 << 20, shm_max_segments=8, codec=None, stats=False,
+                         **kwargs):
+        """Options of start() that shape the wrapper process, comparable with ==."""
+        return {
+            "shm": (shm_threshold, shm_max_segments) if shared_memory else None,
+            # ArrayCodec has no value equality, so this is the same codec object.
+            "codec": codec,
+            "stats": stats,
+            "kwargs": kwargs,
+        }
 
-        # Set to nonzero when the child starts correctly. Set it back to zero as a termination signal.
-        self.__port_val = mp.Value('i', 0)
-        self.__server_proc = mp.Process(target=spawn_wrapper, args=(self.__port_val,))
-        self.__server_proc.start()
-        while self.__port_val.value == 0:
-            #print("Waiting for server to start...")
-            time.sleep(sleep_dt)
-
-        if self.__port_val.value == -1:
-            # Import error. server did not start correctly
-            return self.__server_proc.join()
-        self.__client = rpyc.connect('localhost', self.__port_val.value, config={'allow_public_attrs' : True})
+    def start(self, sleep_dt=None, timeout=60, transport="tcp", shared_memory=False, shm_threshold=1 << 20, shm_max_segments=8,
+              pool=None, cache_attributes=True, codec=None, stats=False, multi_client=False, **kwargs):
+        """
+        Spawn the o3d visualizer-running process. Uses rpyc to do communication.
+
+        The child reports back over a pipe as soon as it is ready, or with the traceback if
+        create_wrapper_service fails. `startup_time` (total) and `init_time` (create_wrapper_service
+        in the child) are recorded in seconds.
+
+        Parameters:
+        -------------------
+        sleep_dt:           float   Deprecated, has no effect. start() used to poll the child every sleep_dt
+                                    seconds, it now returns as soon as the child reports it is ready.
+                                    Still the first parameter, so start(0.5) keeps meaning sleep_dt.
+
+        timeout:            float   Seconds to wait for the child to be ready before killing it.
+
+        transport:          str     "tcp", "unix" or "socketpair", see TRANSPORTS.
+                                    "unix" and "socketpair" skip the loopback TCP stack and open no port.
+
+        shared_memory:      bool    Send large numpy arrays through shared memory segments
+                                    instead of the socket, in both directions. Only for this host's
+                                    connection, stop() unlinks the segments.
+
+        shm_threshold:      int     Minimum array size in bytes to go through shared memory.
+
+        shm_max_segments:   int     Segments each process may create. Once they are all in use,
+                                    arrays fall back to the socket.
+
+        pool:               WarmPool    Take an idle, preloaded process from this pool instead of forking.
+                                        stop() gives it back. "socketpair" is not available with a pool.
+                                        A pool made for another host type or other start options
+                                        is not used, the process is forked as without one.
+
+        cache_attributes:   bool    Remember the remote functions and objects returned by attribute lookups,
+                                    so `host.plot(...)` is one round trip instead of two.
+                                    See `uncached_attributes` and `invalidate()`.
+
+        codec:              ArrayCodec  Compress and/or reduce the precision of large arrays sent either way,
+                                        for slow links, or send repeated arrays as digests (cache_bytes).
+                                        Statistics of this side are in `array_codec.stats()`.
+
+        stats:              bool    Record call, byte and serialization counters and histograms in both
+                                    processes, read them with `stats()`. Can be toggled later with `enable_stats()`.
+                                    Recording in this process is shared by all hosts, it stops when the last
+                                    host recording is stopped.
+
+        multi_client:       bool    Keep listening after this host connects, so other processes can attach()
+                                    (AsyncWrapperService only). Off by default: the listener is closed
+                                    once the owner is connected.
+        """
+        if sleep_dt is not None:
+            print(f"{type(self).__name__}: start(sleep_dt=...) is deprecated and has no effect, "
+                  f"startup waits for the child to report it is ready (see timeout)")
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Unknown transport {transport}, expected one of {TRANSPORTS}")
+        if multi_client and transport == "socketpair":
+            raise ValueError("socketpair transport serves a single client, it can't be used with multi_client")
+        if pool is not None and transport == "socketpair":
+            raise ValueError("socketpair transport needs a fresh process, it can't be used with a pool")
+        if pool is not None:
+            options = self._process_options(shared_memory, shm_threshold, shm_max_segments, codec, stats, **kwargs)
+            if not pool.accepts(self, options):
+                print(f"{type(self).__name__}: pool is for {pool.host_cls.__name__} with other start options, "
+                      f"starting a fresh process")
+                pool = None
+        self.__client = None
+        self.__run_batch = None
+        self.__run_batch_async = None
+        self.__proxies = {} if cache_attributes else None
+        self.__socket_dir = None
+        self.__pool = pool
+        self.__server_proc = None
+        self.address = None
+        self.array_codec = codec
+        if stats:
+            self._record_stats(True)
+        self.__worker = None
+        self.startup_time = None
+        self.init_time = None
+        shm = (shm_threshold, shm_max_segments) if shared_memory else None
+        # Created before forking, so the child shares the resource tracker (see SharedMemoryPool).
+        self.__shm_pool = SharedMemoryPool(shm_threshold, shm_max_segments) if shared_memory else None
+
+        socket_path = None
+        parent_sock = child_sock = None
+        if transport == "unix":
+            self.__socket_dir = tempfile.mkdtemp(prefix="plot_wrapper_")
+            socket_path = os.path.join(self.__socket_dir, "rpyc.sock")
+        elif transport == "socketpair":
+            parent_sock, child_sock = socket.socketpair()
+
+        def spawn_wrapper(ready_conn):
+            if parent_sock is not None:
+                parent_sock.close()
+            try:
+                return self._serve_wrapper(ready_conn, kwargs, socket_path=socket_path, sock=child_sock, codec=codec,
+                                           stats=stats, multi_client=multi_client, shm=shm)
+            finally:
+                ready_conn.close()
+
+        start_time = time.perf_counter()
+        if pool is not None:
+            self.__worker = pool.checkout()
+            if self.__worker is None:
+                print(f"{type(self).__name__}: pool workers failed to preload, starting a fresh process\n"
+                      f"{pool.preload_error}")
+                pool = self.__pool = None
+        if pool is not None:
+            self.__server_proc = self.__worker.proc
+            ready_recv = self.__worker.conn
+            self.__worker.conn.send(("start", kwargs, socket_path, shm, codec, stats, multi_client))
+        else:
+            ready_recv, ready_send = mp.Pipe(duplex=False)
+            self.__server_proc = mp.Process(target=spawn_wrapper, args=(ready_send,))
+            self.__server_proc.start()
+            # Close our copy of the child's end, so the pipe reports EOF if the child dies.
+            ready_send.close()
+            if child_sock is not None:
+                child_sock.close()
+        try:
+            port = self._wait_ready(ready_recv, timeout)
+        except Exception:
+            if parent_sock is not None:
+                parent_sock.close()
+            if self.__worker is not None:
+                pool.discard(self.__worker)
+                self.__worker = None
+            if self.__socket_dir is not None:
+                shutil.rmtree(self.__socket_dir, ignore_errors=True)
+                self.__socket_dir = None
+            self._close_shm_pool()
+            raise
+        finally:
+            if pool is None:
+                ready_recv.close()
+
+        if transport == "unix":
+            self.address = socket_path
+        elif transport == "tcp":
+            self.address = ("127.0.0.1", port)
+        self.__client = self._connect(self.address, codec, sock=parent_sock, shm_pool=self.__shm_pool)
+        self.startup_time = time.perf_counter() - start_time
         return 0
 
+    def attach(self, address, codec=None, cache_attributes=True):
+        """Connect to a wrapper started by a ServiceHost in another process, to draw in the same window.
+
+        Only wrappers built on AsyncWrapperService, started with multi_client=True and the "tcp" or "unix"
+        transport, serve several clients. The process that called start() keeps control: stopping it closes the wrapper
+        for everyone, while stop() on an attached host only disconnects.
+
+        Parameters:
+        -------------------
+        address:            str or tuple    `address` of the starting host: socket path or (host, port).
+
+        codec:              ArrayCodec      See start(). Need not match the wrapper's: arrays are sent as digests
+                                            only between sides whose codecs both have cache_bytes.
+
+        cache_attributes:   bool            See start().
+        """
+        self.__client = None
+        self.__run_batch = None
+        self.__run_batch_async = None
+        self.__proxies = {} if cache_attributes else None
+        self.__socket_dir = None
+        self.__pool = None
+        self.__worker = None
+        self.__server_proc = None
+        self.address = address
+        self.array_codec = codec
+        self.__client = self._connect(address, codec)
+        return 0
+
+    def _connect(self, address, codec, sock=None, shm_pool=None):
+        config = {'allow_public_attrs' : True}
+        if codec is not None:
+            config['array_codec'] = codec
+        if shm_pool is not None:
+            config['shm_pool'] = shm_pool
+        from rpyc.core import SocketStream
+        if sock is not None:
+            client = rpyc.utils.factory.connect_stream(SocketStream(sock), config=config)
+        elif isinstance(address, str):
+            client = rpyc.utils.factory.unix_connect(address, config=config)
+        else:
+            # Without channel compression, Nagle's algorithm holds back the tail of large messages.
+            client = rpyc.utils.factory.connect_stream(SocketStream.connect(*address, nodelay=True), config=config)
+        disable_channel_compression(client)
+        cache = connection_cache(client)
+        if cache is not None:
+            # Digests only go to a side that keeps arrays too, the wrapper's codec may not cache.
+            cache.peer_has_cache = getattr(client.root, SERVICE_PREFIX + "array_cache")(True)
+        _stats.instrument(client)
+        return client
+
+    def _wait_ready(self, ready_recv, timeout):
+        """Wait for the child's startup messages. Returns the port it listens on."""
+        deadline = time.perf_counter() + timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not ready_recv.poll(remaining):
+                self.__server_proc.terminate()
+                self.__server_proc.join()
+                raise TimeoutError(f"{type(self).__name__}: wrapper process not ready after {timeout} s")
+            try:
+                msg = ready_recv.recv()
+            except EOFError:
+                self.__server_proc.join()
+                raise RuntimeError(f"{type(self).__name__}: wrapper process exited during startup "
+                                   f"with code {self.__server_proc.exitcode}")
+            if msg[0] == "init":
+                self.init_time = msg[1]
+            elif msg[0] == "ready":
+                return msg[1]
+            elif msg[0] == "error":
+                self.__server_proc.join()
+                raise RuntimeError(f"{type(self).__name__}: wrapper process failed to start\n{msg[1]}")
+
     def stop(self):
         #print("Stopping server")
+        self.invalidate()
+        self._record_stats(False)
+        if self.__server_proc is None and self.__worker is None:
+            # Attached to another host's wrapper, leave it running.
+            if self.__client is not None:
+                self.__client.close()
+                self.__client = None
+            return
         if self.__client is not None:
             try:
                 self.__client.root.stop()
             except EOFError:
                 pass
-        self.__server_proc.join()
+        if self.__worker is not None:
+            # Pooled process goes back to the pool instead of exiting.
+            self.__pool.checkin(self.__worker)
+            self.__worker = None
+        else:
+            self.__server_proc.join()
+        if self.__socket_dir is not None:
+            shutil.rmtree(self.__socket_dir, ignore_errors=True)
+            self.__socket_dir = None
+        self._close_shm_pool()
         #print("Stopped server.")
 
+    def _close_shm_pool(self):
+        """Unlink the shared memory segments this host wrote into, once the wrapper no longer reads them."""
+        if self.__shm_pool is not None:
+            self.__shm_pool.close()
+            self.__shm_pool = None
+
+    def invalidate(self, *names):
+        """Forget cached remote attributes, all of them if no names are given.
+
+        Needed after the wrapper rebinds an attribute that was already looked up
+        (ex. `vis.some_attr = other_object` on the child side).
+        """
+        if self.__proxies is None:
+            return
+        if len(names) == 0:
+            self.__proxies.clear()
+        for name in names:
+            self.__proxies.pop(name, None)
+
+    def batch(self, keep_results=False):
+        """Record calls made inside a `with` block and send them to the wrapper in a single request.
+
+        Calls return BatchHandles instead of results. Handles can be used as call targets or arguments
+        later in the same batch. Lists passed as arguments are still sent by reference.
+
+        Parameters:
+        -------------------
+        keep_results:   bool        Send back the result of every call, read them with Batch.result().
+        """
+        return Batch(self, keep_results)
+
+    def _begin_batch(self, batch):
+        if self.__batch is not None:
+            raise RuntimeError("Batches can't be nested")
+        self.__batch = batch
+
+    def _end_batch(self, batch):
+        self.__batch = None
+
+    def _run_batch(self, ops, keep_results):
+        if self.__run_batch is None:
+            # Resolving the remote method is a round trip of its own, only do it once.
+            self.__run_batch = self.__client.root.run_batch
+        return self.__run_batch(ops, keep_results)
+
+    def _run_batch_async(self, ops):
+        if self.__run_batch_async is None:
+            self.__run_batch_async = rpyc.async_(self.__client.root.run_batch)
+        return self.__run_batch_async(ops)
+
+    def update_channel(self, window=2, policy="latest", max_pending=8):
+        """Create an UpdateChannel for pushing frames without waiting on the wrapper.
+
+        Parameters:
+        -------------------
+        window:         int         Frames sent to the wrapper but not finished yet, at most.
+
+        policy:         str         "latest", "drop_oldest" or "block", see UpdateChannel.
+
+        max_pending:    int         Frames waiting to be sent, at most (ignored by "block").
+        """
+        return UpdateChannel(self, window=window, policy=policy, max_pending=max_pending)
+
+    def _service_call(self, name, *args):
+        """Call the wrapper service's exposed_<name>, not the wrapped object's attribute."""
+        return getattr(self.__client.root, SERVICE_PREFIX + name)(*args)
+
+    def stats(self, reset=False):
+        """Counters and histograms recorded in this process ("parent") and the wrapper process ("child").
+
+        Times are in microseconds: dump.<type> / load.<loader> for serialization, call.<function>
+        for calls served, request.<kind> for round trips made, spin.* for the AsyncWrapperService loop.
+        Sizes are bytes (message_bytes_*) or requests (spin.backlog).
+
+        Parameters:
+        -------------------
+        reset:      bool        Clear everything after reading it, in both processes.
+        """
+        child = self._service_call("stats", reset)
+        parent = _stats.snapshot()
+        if reset:
+            _stats.reset()
+        return {"parent": _stats.to_dict(parent), "child": _stats.to_dict(child)}
+
+    def enable_stats(self, enabled=True):
+        """Turn recording on or off in both processes. Off costs nothing: the plain functions are put back."""
+        self._service_call("enable_stats", enabled)
+        self._record_stats(enabled)
+
+    def _record_stats(self, enabled):
+        """Turn recording on or off in this process for this host. Off only once no other host records."""
+        hosts = ServiceHost._stats_hosts
+        conns = (self.__client,) if self.__client is not None else ()
+        if enabled:
+            hosts.add(id(self))
+            _stats.enable(conns)
+        elif id(self) in hosts:
+            hosts.discard(id(self))
+            if len(hosts) == 0:
+                _stats.disable(conns)
+
+    def frame_rate(self):
+        """Frames per second an AsyncWrapperService drew over the last second, and the frames drawn so far."""
+        return self._service_call("frame_rate")
+
+    def start_recording(self, path, fps=None, command=None, max_queue=4):
+        """Record what an AsyncWrapperService draws, in the wrapper process. See FrameRecorder for
+        path, command and max_queue. fps defaults to the spin rate.
+        """
+        if command is not None:
+            # Sent by value, a list would go by reference.
+            command = tuple(command)
+        return self._service_call("start_recording", path, fps, command, max_queue)
+
+    def stop_recording(self):
+        """Finish writing the recording. Returns (frames written, frames skipped), None if not recording."""
+        return self._service_call("stop_recording")
+
+    def clients(self):
+        """Clients connected to the wrapper: dicts of address, owner, requests served,
+        serve_time and connected_time (seconds). Empty for wrappers serving a single client.
+        """
+        return [dict(zip(CLIENT_FIELDS, client)) for client in self._service_call("clients")]
+
+    def fileno(self):
+        """File descriptor of the connection to the wrapper, to wait on several hosts with select()."""
+        return self.__client.fileno()
+
     # Forward all calls to rpyc.
     def __getattr__(self, name):
-        return getattr(self.__client.root, name)
+        if self.__batch is not None:
+            return self.__batch.getattr(name)
+        proxies = self.__proxies
+        if proxies is not None:
+            try:
+                return proxies[name]
+            except KeyError:
+                pass
+        value = getattr(self.__client.root, name)
+        # Only references are cached. Dumpable values are copies and would go stale.
+        if proxies is not None and isinstance(value, netref.BaseNetref) and name not in self.uncached_attributes:
+            proxies[name] = value
+        return value
 
 
     # Implement Python contextmanager ( with MatplotlibWrapper() as x: )
@@ -189,21 +1107,142 @@ class ServiceHost:
         self.stop()
 
 
-def spin_server_singlethread(server, spin_callback):
+class _Client:
+    __slots__ = ["conn", "sock", "address", "owner", "requests", "serve_time", "connected"]
+
+    def __init__(self, conn, sock, address, owner):
+        self.conn = conn
+        self.sock = sock
+        self.address = address
+        self.owner = owner
+        self.requests = 0
+        self.serve_time = 0.0
+        self.connected = time.perf_counter()
+
+
+# Fields of each tuple returned by ClientMux.client_stats().
+CLIENT_FIELDS = ("address", "owner", "requests", "serve_time", "connected_time")
+
+
+class ClientMux:
+    """Several client connections served from one thread, through the same poll(timeout) as a Connection.
+
+    Each poll() serves at most one request, taking ready clients in turn so a chatty client can't
+    starve the others. New connections are accepted as they come if `accept` is set. The first client (the ServiceHost
+    that started the wrapper) is the owner: when it disconnects, poll() raises EOFError and serving
+    ends. Other clients can come and go.
+    """
+
+    def __init__(self, server, owner_sock, accept=False):
+        self.server = server
+        self.accept = accept
+        self.clients = []
+        self.next = 0
+        self._add(owner_sock, owner=True)
+
+    def _add(self, sock, owner=False):
+        sock.setblocking(True)
+        self.server.clients.add(sock)
+        conn = _serve_socket(self.server, sock, owner)
+        # Unix socket peers have no address.
+        address = conn._config["endpoints"][1] or f"fd {sock.fileno()}"
+        self.clients.append(_Client(conn, sock, address, owner))
+
+    def _remove(self, client):
+        self.clients.remove(client)
+        self.server.clients.discard(client.sock)
+        client.conn.close()
+
+    def _accept(self):
+        try:
+            sock, addrinfo = self.server.listener.accept()
+        except (socket.timeout, BlockingIOError, InterruptedError):
+            return
+        self.server.logger.info(f"accepted {addrinfo} with fd {sock.fileno()}")
+        self._add(sock)
+
+    def poll(self, timeout=0):
+        """Serve one request from the next ready client, waiting up to timeout seconds for one.
+
+        Returns True if a request was served.
+        """
+        deadline = time.perf_counter() + timeout
+        while True:
+            if not self.server.active:
+                raise EOFError("server closed")
+            clients = self.clients
+            listeners = [self.server.listener] if self.accept else []
+            ready, _, _ = select.select(listeners + [client.sock for client in clients], [], [],
+                                        max(0, deadline - time.perf_counter()))
+            if self.accept and self.server.listener in ready:
+                self._accept()
+            n = len(clients)
+            for i in range(n):
+                client = clients[(self.next + i) % n]
+                if client.sock not in ready:
+                    continue
+                self.next = (self.next + i + 1) % n
+                start = time.perf_counter()
+                try:
+                    served = client.conn.poll(0)
+                except EOFError:
+                    if client.owner:
+                        raise
+                    self.server.logger.info(f"goodbye {client.address}")
+                    self._remove(client)
+                    break
+                if served:
+                    client.requests += 1
+                    client.serve_time += time.perf_counter() - start
+                    return True
+            if time.perf_counter() >= deadline:
+                return False
+
+    @property
+    def connections(self):
+        return [client.conn for client in self.clients]
+
+    def client_stats(self):
+        """One tuple per connected client, see CLIENT_FIELDS. serve_time and connected_time are in seconds."""
+        now = time.perf_counter()
+        return tuple((str(client.address), client.owner, client.requests, client.serve_time, now - client.connected)
+                     for client in self.clients)
+
+    def close(self):
+        for client in list(self.clients):
+            self._remove(client)
+
+
+def _serve_socket(server, sock, owner=True):
+    """rpyc connection to the server's service over an accepted socket."""
+    from rpyc.core import SocketStream, Channel
+    addrinfo = sock.getpeername()
+    server.logger.info(f"welcome {addrinfo}")
+    config = dict(server.protocol_config, credentials=None,
+                  endpoints=(sock.getsockname(), addrinfo), logger=server.logger)
+    if not owner:
+        # Shared memory is set up with the owner only, attached clients get arrays over the socket.
+        config.pop("shm_pool", None)
+    return server.service._connect(Channel(SocketStream(sock)), config)
+
+
+def spin_server_singlethread(server, spin_callback, on_listen=None, multi_client=False):
     """Set up a socket server but allow a custom callback for the event loop.
 
     This lets us run server logic and vis logic in the same thread.
+    on_listen is called once the server accepts connections.
+    spin_callback gets a ClientMux serving the first client, and every client that connects later
+    if multi_client is set. Otherwise the listener is closed once the first client is connected.
     """
 
     # Copied from rpyc server implementation.
     # https://github.com/tomerfiliba-org/rpyc/blob/master/rpyc/utils/server.py#L258
-    import socket
     import errno
-    from contextlib import closing
-    from rpyc.lib.compat import poll, get_exc_errno
-    from rpyc.core import SocketStream, Channel
+    from rpyc.lib.compat import get_exc_errno
     server._listen()
     server._register()
+    if on_listen is not None:
+        on_listen()
 
     interrupted = False
     try:
@@ -216,39 +1255,34 @@ def spin_server_singlethread(server, spin_callback):
                 pass
             except socket.error:
                 ex = sys.exc_info()[1]
-                if get_exc_errno(ex) in (errno.EINTR, errno,EAGAIN):
+                if get_exc_errno(ex) in (errno.EINTR, errno.EAGAIN):
                     pass
                 else:
                     raise EOFError()
             else:
                 break
         print("connected!")
-        sock.setblocking(True)
         server.logger.info(f"accepted {addrinfo} with fd {sock.fileno()}")
-        server.clients.add(sock)
-        # IMPLEMENT: server._authenticate_and_serve_client
+        if not multi_client:
+            server.listener.close()
+        mux = None
         try:
-            # IMPLEMENT: server._serve_client(sock, None)
-            addrinfo = sock.getpeername()
-            server.logger.info(f"welcome {addrinfo}")
-            config = dict(server.protocol_config, credentials=None,
-                            endpoints=(sock.getsockname(), addrinfo), logger=server.logger)
-            conn = server.service._connect(Channel(SocketStream(sock)), config)
+            mux = ClientMux(server, sock, accept=multi_client)
 
             ###### SPIN FOREVER HERE
             print("spin forever")
-            spin_callback(conn)
+            spin_callback(mux)
             ###### SPIN FOREVER HERE
+        except EOFError:
+            raise
         except Exception:
             server.logger.exception("client connection terminated abruptly")
             raise
         finally:
-            try:
-                sock.shutdown(socket.SHUT_RDWR)
-            except Exception:
-                pass
-            closing(sock)
-            server.clients.discard(sock)
+            if mux is not None:
+                mux.close()
+            else:
+                sock.close()
     except EOFError:
         pass  # server closed by another thread
     except KeyboardInterrupt:
@@ -259,4 +1293,3 @@ def spin_server_singlethread(server, spin_callback):
         server.logger.info("Wrapper: server has terminated")
         server.close()
         return interrupted
-
@@ -0,0 +1,239 @@
+"""Pool of pre-forked wrapper processes with their visualization libraries already imported."""
+import multiprocessing as mp
+from multiprocessing import resource_tracker
+import os
+import resource
+import traceback
+
+try:
+    import _stats
+except ImportError:
+    from . import _stats
+
+
+def _current_rss():
+    """Resident memory of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak instead of current, but better than nothing. Reported in KB on Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _pool_worker(host, conn, max_uses, max_rss):
+    """Worker process: preload, then serve one session per "start" command until retired."""
+    try:
+        try:
+            host.preload_wrapper_service()
+        except Exception:
+            conn.send(("error", traceback.format_exc()))
+            return
+        conn.send(("idle",))
+        uses = 0
+        while True:
+            msg = conn.recv()
+            if msg[0] == "exit":
+                return
+            _, kwargs, socket_path, shm, codec, stats, multi_client = msg
+            try:
+                error = host._serve_wrapper(conn, kwargs, socket_path=socket_path, reset=True, codec=codec,
+                                            stats=stats, multi_client=multi_client, shm=shm)
+            except Exception:
+                # Already reported to the parent. State is unknown, retire.
+                return
+            # The next session starts with its own stats.
+            _stats.disable()
+            _stats.reset()
+            uses += 1
+            if error != 0:
+                return
+            if max_uses is not None and uses >= max_uses:
+                return
+            if max_rss is not None and _current_rss() > max_rss:
+                return
+            conn.send(("idle",))
+    except EOFError:
+        pass  # Pool closed.
+    finally:
+        conn.close()
+
+
+class PoolWorker:
+    """Parent side handle of a pooled process."""
+
+    def __init__(self, proc, conn):
+        self.proc = proc
+        self.conn = conn
+        self.warm = False
+
+
+class WarmPool:
+    """
+    Keep `size` idle wrapper processes around, with `preload_wrapper_service()` already run,
+    so `start(pool=pool)` only has to create the service.
+
+    ```
+    pool = WarmPool(MatplotlibWrapper, size=2)
+    plt = MatplotlibWrapper()
+    plt.start(pool=pool)  # milliseconds instead of a fresh matplotlib import
+    ...
+    plt.stop()            # figures are closed and the process goes back to the pool
+    pool.close()
+    ```
+
+    A worker only serves hosts of `host_cls` started with `start_options`. Any other
+    `start(pool=pool)` forks a fresh process, as without a pool. So does every start once
+    `preload_wrapper_service()` failed in a worker, see `preload_error`.
+
+    Taking a worker doesn't fork a replacement, so start() doesn't pay for it. Workers are
+    replaced when sessions are stopped, or by calling `refill()`.
+    """
+
+    def __init__(self, host_cls, size=2, max_uses=None, max_rss=None, start_options=None):
+        """
+        Parameters:
+        -------------------
+        host_cls:       type        ServiceHost subclass the workers are preloaded for.
+
+        size:           int         Idle processes to keep ready between sessions.
+
+        max_uses:       int         Retire a process after this many sessions. None for no limit.
+
+        max_rss:        int         Retire a process whose resident memory exceeds this many bytes
+                                    after a session. None for no limit.
+
+        start_options:  dict        Keyword arguments of start() that reach the wrapper process
+                                    (create_wrapper_service kwargs, codec, stats, shared_memory...)
+                                    the workers are for. None for start()'s defaults.
+        """
+        self.host_cls = host_cls
+        self.host = host_cls()
+        self.start_options = host_cls._process_options(**(start_options or {}))
+        self.size = size
+        self.max_uses = max_uses
+        self.max_rss = max_rss
+        self.idle = []
+        self.busy = set()
+        # Traceback of the first preload_wrapper_service() that failed. No worker is spawned after that.
+        self.preload_error = None
+        # Workers fork from here, they have to share the parent's tracker for shared memory.
+        resource_tracker.ensure_running()
+        self.refill()
+
+    def accepts(self, host, start_options):
+        """True if a worker can serve `host` started with `start_options` (see ServiceHost._process_options)."""
+        return type(host) is self.host_cls and start_options == self.start_options
+
+    def _spawn(self):
+        conn, child_conn = mp.Pipe()
+        # Daemon, so forgotten pools don't keep the parent from exiting.
+        proc = mp.Process(target=_pool_worker, args=(self.host, child_conn, self.max_uses, self.max_rss),
+                          daemon=True)
+        proc.start()
+        child_conn.close()
+        return PoolWorker(proc, conn)
+
+    def refill(self):
+        """Spawn workers until `size` are idle."""
+        while self.preload_error is None and len(self.idle) < self.size:
+            self.idle.append(self._spawn())
+
+    def _preloaded(self, worker):
+        """Wait for a worker to finish preloading. Discards it and returns False if preloading failed."""
+        try:
+            msg = worker.conn.recv()
+        except EOFError:
+            msg = None
+        if msg is not None and msg[0] == "idle":
+            worker.warm = True
+            return True
+        self.preload_error = msg[1] if msg is not None else "worker exited while preloading"
+        self.discard(worker)
+        return False
+
+    def _poll_warm(self):
+        for worker in list(self.idle):
+            if not worker.warm and worker.conn.poll():
+                self._preloaded(worker)
+
+    def checkout(self):
+        """Take an idle worker, preferring ones that finished preloading.
+        None if preload_wrapper_service() failed in a worker.
+        """
+        self._poll_warm()
+        while self.preload_error is None:
+            warm = [worker for worker in self.idle if worker.warm]
+            if len(warm) > 0:
+                worker = warm[0]
+                self.idle.remove(worker)
+            else:
+                # Still preloading. Its "idle" message has to be consumed before the startup handshake.
+                worker = self.idle.pop(0) if len(self.idle) > 0 else self._spawn()
+                if not self._preloaded(worker):
+                    continue
+            worker.warm = False
+            self.busy.add(worker)
+            return worker
+        return None
+
+    def checkin(self, worker, timeout=10):
+        """Give a worker back after its session was stopped. Retired workers are replaced."""
+        self.busy.discard(worker)
+        try:
+            if worker.conn.poll(timeout) and worker.conn.recv()[0] == "idle":
+                worker.warm = True
+                # A returning worker is ready now, replacements spawned meanwhile may still be preloading.
+                self.idle.insert(0, worker)
+                self._trim()
+                self.refill()
+                return
+        except (EOFError, OSError):
+            pass
+        self.discard(worker)
+
+    def _trim(self):
+        self._poll_warm()
+        while len(self.idle) > self.size:
+            cold = [worker for worker in self.idle if not worker.warm]
+            worker = cold[-1] if len(cold) > 0 else self.idle[-1]
+            self.idle.remove(worker)
+            try:
+                worker.conn.send(("exit",))
+            except OSError:
+                pass
+            if not worker.warm:
+                # Don't wait for its imports to finish.
+                worker.proc.terminate()
+            self.discard(worker)
+
+    def discard(self, worker):
+        """Stop a worker and forget it."""
+        self.busy.discard(worker)
+        if worker in self.idle:
+            self.idle.remove(worker)
+        worker.proc.join(timeout=1)
+        if worker.proc.is_alive():
+            worker.proc.terminate()
+            worker.proc.join()
+        worker.conn.close()
+        self.refill()
+
+    def close(self):
+        """Stop all idle workers. Busy ones exit when their session is stopped."""
+        self.size = 0
+        for worker in self.idle:
+            try:
+                worker.conn.send(("exit",))
+            except OSError:
+                pass
+        for worker in self.idle:
+            worker.proc.join()
+            worker.conn.close()
+        self.idle.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,149 @@
+"""Recording of the frames an AsyncWrapperService draws, inside the wrapper process.
+
+Frames are captured in the spin loop right after the window is drawn, and written by a background
+thread: to an image sequence, or to the stdin of an encoder process (ffmpeg by default for video
+files). The queue between the two is bounded. When the writer falls behind, frames are skipped
+before being captured, so the spin loop never waits on the disk or the encoder.
+"""
+import os
+import queue
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".webm", ".avi", ".mov")
+
+# Raw frames on stdin. {width}, {height}, {fps}, {pix_fmt} and {path} are filled in on the first frame.
+# The pad filter rounds the size up to even, which yuv420p needs.
+FFMPEG_COMMAND = ("ffmpeg", "-y", "-loglevel", "error",
+                  "-f", "rawvideo", "-pix_fmt", "{pix_fmt}", "-s", "{width}x{height}", "-r", "{fps}", "-i", "-",
+                  "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p", "{path}")
+
+PIX_FMTS = {1: "gray", 3: "rgb24", 4: "rgba"}
+
+
+def _to_uint8(frame):
+    """(H, W), (H, W, 3) or (H, W, 4) uint8. Float frames (open3d) are in [0, 1]."""
+    frame = np.asarray(frame)
+    if frame.dtype != np.uint8:
+        frame = (np.clip(frame, 0, 1) * 255).round().astype(np.uint8)
+    return np.ascontiguousarray(frame)
+
+
+class FrameRecorder:
+    """
+    ```
+    recorder = FrameRecorder("session.mp4", fps=30)     # or "frames/", "frames/{:05d}.png", command=[...]
+    ...
+    recorder.capture(grab_frame)    # in the draw loop, calls grab_frame() only for frames it will write
+    ...
+    written, skipped = recorder.stop()
+    ```
+    """
+
+    def __init__(self, path, fps=30, command=None, max_queue=4):
+        """
+        Parameters:
+        -------------------
+        path:       str         Video file (".mp4", ".mkv"... piped to ffmpeg), directory (PNG sequence)
+                                or image file pattern with a format field for the frame number
+                                (ex. "frames/{:05d}.png", any format PIL writes, or ".npy").
+
+        fps:        float       Frames captured per second, at most. Also the frame rate given to the encoder.
+
+        command:    list        Encoder command reading raw frames on stdin, instead of ffmpeg or images.
+                                Same placeholders as FFMPEG_COMMAND.
+
+        max_queue:  int         Captured frames waiting for the writer, at most. Frames past that are skipped.
+        """
+        if command is None and path.lower().endswith(VIDEO_EXTENSIONS):
+            command = FFMPEG_COMMAND
+        if command is None:
+            if "{" not in path:
+                os.makedirs(path, exist_ok=True)
+                path = os.path.join(path, "frame_{:06d}.png")
+            elif os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.fps = fps
+        self.command = command
+        self.frames_written = 0
+        self.frames_skipped = 0
+        self.error = None
+        self._dt = 1 / fps
+        self._next_capture = 0.0
+        self._queue = queue.Queue(max_queue)
+        self._process = None
+        self._shape = None
+        self._thread = threading.Thread(target=self._write_loop, name="plot_wrapper recorder", daemon=True)
+        self._thread.start()
+
+    def capture(self, grab):
+        """Queue grab() (a frame array, or None if there is nothing to record) if a frame is due.
+
+        Skipped without calling grab() if the writer is behind.
+        """
+        now = time.perf_counter()
+        if now < self._next_capture:
+            return
+        # Late captures don't try to catch up.
+        self._next_capture = max(self._next_capture + self._dt, now)
+        if self._queue.full() or self.error is not None:
+            self.frames_skipped += 1
+            return
+        frame = grab()
+        if frame is not None:
+            self._queue.put(frame)
+
+    def stop(self):
+        """Write the frames still queued, close the encoder and return (frames written, frames skipped)."""
+        self._queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            print(f"plot_wrapper: recording to {self.path} failed: {self.error}")
+        return (self.frames_written, self.frames_skipped)
+
+    def _write_loop(self):
+        try:
+            while True:
+                frame = self._queue.get()
+                if frame is None:
+                    break
+                if self.error is None:
+                    self._write(_to_uint8(frame))
+        except Exception as e:
+            self.error = e
+            # Keep draining, capture() stops queueing once error is set.
+            while self._queue.get() is not None:
+                pass
+        finally:
+            if self._process is not None:
+                self._process.stdin.close()
+                if self._process.wait() != 0 and self.error is None:
+                    self.error = f"{self.command[0]} exited with code {self._process.returncode}"
+
+    def _write(self, frame):
+        if self._shape is None:
+            self._shape = frame.shape
+            if self.command is not None:
+                channels = 1 if frame.ndim == 2 else frame.shape[2]
+                fields = {"width": frame.shape[1], "height": frame.shape[0], "fps": self.fps,
+                          "pix_fmt": PIX_FMTS[channels], "path": self.path}
+                self._process = subprocess.Popen([arg.format(**fields) for arg in self.command],
+                                                 stdin=subprocess.PIPE)
+        elif frame.shape != self._shape:
+            # Raw video can't change size. Resized windows stop recording until they are back.
+            self.frames_skipped += 1
+            return
+        if self._process is not None:
+            self._process.stdin.write(memoryview(frame.reshape(-1)))
+        else:
+            path = self.path.format(self.frames_written)
+            if path.endswith(".npy"):
+                np.save(path, frame)
+            else:
+                from PIL import Image
+                Image.fromarray(frame).save(path)
+        self.frames_written += 1
@@ -0,0 +1,105 @@
+"""Pool of shared memory segments for moving large arrays between the two processes of a ServiceHost.
+
+Each segment holds one array at a time. The first byte of a segment is a state flag
+that the writer sets when it fills the segment and the reader clears once it has copied
+the array out, so a segment can be reused for the next frame without allocating a new one.
+"""
+from collections import OrderedDict
+import itertools
+import os
+from multiprocessing import resource_tracker, shared_memory
+
+# Data starts after this many bytes, keeps the array aligned for any dtype.
+HEADER_SIZE = 64
+
+FREE = 0
+IN_USE = 1
+
+
+class SharedMemoryPool:
+    """Segments owned (written) by this process, plus a cache of segments attached (read) from the peer."""
+
+    def __init__(self, threshold=1 << 20, max_segments=8, max_attached=32):
+        """
+        Parameters:
+        -------------------
+        threshold:      int         Arrays with at least this many bytes are sent through shared memory.
+
+        max_segments:   int         Maximum number of segments this process will create at once.
+                                    When all are in use, arrays are sent inline over the socket.
+
+        max_attached:   int         Maximum number of peer segments to keep mapped.
+        """
+        self.threshold = threshold
+        self.max_segments = max_segments
+        self.max_attached = max_attached
+        self.pid = os.getpid()
+        self.owned = []
+        self.attached = OrderedDict()
+        self._names = itertools.count()
+        # The resource tracker is shared with the forked child only if it is already running.
+        # Otherwise each side would unlink the other's segments when it exits.
+        resource_tracker.ensure_running()
+
+    def acquire(self, nbytes):
+        """Return an owned segment with room for `nbytes`, marked in use. None if the pool is exhausted."""
+        best = None
+        for seg in self.owned:
+            if seg.buf[0] == FREE and seg.size - HEADER_SIZE >= nbytes:
+                if best is None or seg.size < best.size:
+                    best = seg
+        if best is None:
+            if len(self.owned) >= self.max_segments:
+                free = [seg for seg in self.owned if seg.buf[0] == FREE]
+                if len(free) == 0:
+                    return None
+                # Every free segment is too small. Replace the smallest one.
+                victim = min(free, key=lambda seg: seg.size)
+                self.owned.remove(victim)
+                victim.close()
+                victim.unlink()
+            best = self._create(nbytes)
+        best.buf[0] = IN_USE
+        return best
+
+    def _create(self, nbytes):
+        # Round up to a power of two so slowly growing arrays don't reallocate every frame.
+        size = max(self.threshold, 1 << max(nbytes - 1, 1).bit_length())
+        name = f"plot_wrapper_{self.pid}_{next(self._names)}"
+        seg = shared_memory.SharedMemory(name=name, create=True, size=size + HEADER_SIZE)
+        seg.buf[0] = FREE
+        self.owned.append(seg)
+        return seg
+
+    def attach(self, name):
+        """Map a segment created by the peer process."""
+        seg = self.attached.get(name)
+        if seg is None:
+            seg = shared_memory.SharedMemory(name=name)
+            self.attached[name] = seg
+            if len(self.attached) > self.max_attached:
+                _, old = self.attached.popitem(last=False)
+                old.close()
+        else:
+            self.attached.move_to_end(name)
+        return seg
+
+    @staticmethod
+    def release(seg):
+        """Mark a peer segment as consumed so the writer can reuse it."""
+        seg.buf[0] = FREE
+
+    def close(self):
+        """Unmap everything, and unlink the segments this process created."""
+        for seg in self.attached.values():
+            seg.close()
+        self.attached.clear()
+        for seg in self.owned:
+            seg.close()
+            # A pool inherited through fork only unmaps, the segments belong to the parent.
+            if self.pid == os.getpid():
+                try:
+                    seg.unlink()
+                except FileNotFoundError:
+                    pass
+        self.owned.clear()
@@ -0,0 +1,189 @@
+"""Counters and latency histograms for the RPC and serialization paths of one process.
+
+Nothing is measured until enable() is called: it swaps timed versions of brine._dump, the custom
+loader, Channel.send/recv and Connection.sync_request in place of the plain ones, and disable()
+puts the plain ones back. AsyncWrapperService.spin checks `enabled` once per frame.
+
+Histograms use power of two buckets: bucket k counts values in [2^(k-1), 2^k) of the unit
+(microseconds for times, bytes or messages for sizes), bucket 0 counts values under 1.
+"""
+import time
+
+from rpyc.core import brine, consts, netref
+from rpyc.core.channel import Channel
+from rpyc.core.protocol import Connection
+
+try:
+    import _brine_patch
+except ImportError:
+    from . import _brine_patch
+
+enabled = False
+counters = {}
+histograms = {}
+
+BUCKETS = 40
+HANDLER_NAMES = {getattr(consts, name): name[len("HANDLE_"):].lower()
+                 for name in dir(consts) if name.startswith("HANDLE_")}
+# Not worth timing one by one, containers are timed through their custom elements.
+UNTIMED_TYPES = brine.simple_types | {tuple, frozenset, slice}
+
+
+class Histogram:
+    __slots__ = ["count", "total", "max", "buckets"]
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = [0] * BUCKETS
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self.buckets[min(int(value).bit_length(), BUCKETS - 1)] += 1
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (0-100)."""
+        target = self.count * q / 100
+        seen = 0
+        for k, n in enumerate(self.buckets):
+            seen += n
+            if n > 0 and seen >= target:
+                return 1 << k
+        return 0
+
+
+def count(name, n=1):
+    counters[name] = counters.get(name, 0) + n
+
+def observe(name, value):
+    histogram = histograms.get(name)
+    if histogram is None:
+        histogram = histograms[name] = Histogram()
+    histogram.add(value)
+
+def observe_time(name, seconds):
+    observe(name, seconds * 1e6)
+
+
+def reset():
+    counters.clear()
+    histograms.clear()
+
+def snapshot():
+    """Everything recorded so far, as nested tuples so it can be sent by value:
+    ((counter, value), ...), ((histogram, count, total, max, (bucket counts...)), ...)
+    """
+    return (enabled,
+            tuple(counters.items()),
+            tuple((name, h.count, h.total, h.max, tuple(h.buckets)) for name, h in histograms.items()))
+
+def to_dict(snap):
+    """Readable form of a snapshot: counters, plus count/mean/p50/p99/max of each histogram."""
+    is_enabled, counter_items, histogram_items = snap
+    result = {"enabled": is_enabled, "counters": dict(counter_items), "histograms": {}}
+    for name, n, total, largest, buckets in histogram_items:
+        h = Histogram()
+        h.count, h.total, h.max, h.buckets = n, total, largest, list(buckets)
+        result["histograms"][name] = {
+            "count": n,
+            "mean": total / n if n else 0,
+            "p50": h.percentile(50),
+            "p99": h.percentile(99),
+            "max": largest,
+            "buckets": buckets,
+        }
+    return result
+
+
+# Timed replacements, only installed while enabled. -------------------------------------------
+
+_plain = {}
+
+def _dump_timed(obj, stream):
+    obj_type = type(obj)
+    if obj_type in UNTIMED_TYPES:
+        return _plain["dump"](obj, stream)
+    start = time.perf_counter()
+    size = len(stream)
+    _plain["dump"](obj, stream)
+    observe_time("dump." + obj_type.__name__, time.perf_counter() - start)
+    count("dump_bytes." + obj_type.__name__, sum(map(len, stream[size:])))
+
+def _load_custom_timed(stream):
+    loader = _brine_patch._custom_loader(brine._load(stream))
+    start = time.perf_counter()
+    obj = loader(stream)
+    observe_time("load." + loader.__name__.replace("_load_", "", 1), time.perf_counter() - start)
+    return obj
+
+def _channel_send_timed(self, data):
+    count("bytes_sent", len(data))
+    count("messages_sent")
+    observe("message_bytes_sent", len(data))
+    return _plain["send"](self, data)
+
+def _channel_recv_timed(self):
+    data = _plain["recv"](self)
+    count("bytes_received", len(data))
+    count("messages_received")
+    observe("message_bytes_received", len(data))
+    return data
+
+def _sync_request_timed(self, handler, *args):
+    start = time.perf_counter()
+    try:
+        return _plain["sync_request"](self, handler, *args)
+    finally:
+        observe_time("request." + HANDLER_NAMES.get(handler, str(handler)), time.perf_counter() - start)
+
+def _handle_call_timed(self, obj, args, kwargs=()):
+    if isinstance(obj, netref.BaseNetref):
+        # Asking a netref for its name would be another round trip.
+        name = "netref"
+    else:
+        name = getattr(obj, "__qualname__", None) or type(obj).__name__
+    start = time.perf_counter()
+    try:
+        return Connection._handle_call(self, obj, args, kwargs)
+    finally:
+        observe_time("call." + name, time.perf_counter() - start)
+
+
+def instrument(conn):
+    """Time calls served by an existing connection (handlers are copied per connection), or stop to."""
+    conn._HANDLERS[consts.HANDLE_CALL] = _handle_call_timed if enabled else Connection._handle_call
+
+def enable(conns=()):
+    """Start recording in this process. `conns` are already open connections to also time calls on."""
+    global enabled
+    if not enabled:
+        _plain["dump"] = brine._dump
+        _plain["send"] = Channel.send
+        _plain["recv"] = Channel.recv
+        _plain["sync_request"] = Connection.sync_request
+        _plain["load_custom"] = brine._load_registry[brine.TAG_CUSTOM]
+        brine._dump = _dump_timed
+        brine._load_registry[brine.TAG_CUSTOM] = _load_custom_timed
+        Channel.send = _channel_send_timed
+        Channel.recv = _channel_recv_timed
+        Connection.sync_request = _sync_request_timed
+        enabled = True
+    for conn in conns:
+        instrument(conn)
+
+def disable(conns=()):
+    """Stop recording and restore the plain functions. Recorded values are kept."""
+    global enabled
+    if enabled:
+        brine._dump = _plain["dump"]
+        brine._load_registry[brine.TAG_CUSTOM] = _plain["load_custom"]
+        Channel.send = _plain["send"]
+        Channel.recv = _plain["recv"]
+        Connection.sync_request = _plain["sync_request"]
+        enabled = False
+    for conn in conns:
+        instrument(conn)
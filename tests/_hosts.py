@@ -0,0 +1,81 @@
+"""Small wrapped objects for tests that talk to a wrapper process."""
+import time
+
+import numpy as np
+
+from plot_wrapper import ServiceHost, WrapperService, AsyncWrapperService
+
+
+class Echo:
+    def echo(self, x):
+        return x
+
+    def first(self, x):
+        return x[0]
+
+    def total(self, x):
+        return float(np.asarray(x).sum())
+
+    # Same names as service calls.
+    def stats(self):
+        return "wrapped stats"
+
+    def clients(self):
+        return "wrapped clients"
+
+
+class EchoHost(ServiceHost):
+    def create_wrapper_service(self, **kwargs):
+        return (0, WrapperService(Echo()))
+
+
+class AsyncEchoHost(ServiceHost):
+    def create_wrapper_service(self, **kwargs):
+        frame = np.zeros((8, 12, 3), dtype=np.uint8)
+        return (0, AsyncWrapperService(Echo(), lambda: None, spinrate=kwargs.get("spinrate", 100),
+                                       capture_func=lambda: frame))
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def record(self, x, delay=0.0):
+        time.sleep(delay)
+        self.calls.append(x)
+
+    def recorded(self):
+        return tuple(self.calls)
+
+
+class RecorderHost(ServiceHost):
+    def create_wrapper_service(self, **kwargs):
+        return (0, WrapperService(Recorder()))
+
+
+class BadPreloadHost(EchoHost):
+    def preload_wrapper_service(self):
+        raise RuntimeError("preload failed")
+
+
+class Target:
+    def __init__(self, name):
+        self.name = name
+
+    def get_name(self):
+        return self.name
+
+
+class Scene:
+    def __init__(self):
+        self.target = Target("first")
+        self.count = 0
+
+    def retarget(self, name):
+        self.target = Target(name)
+        self.count += 1
+
+
+class SceneHost(ServiceHost):
+    def create_wrapper_service(self, **kwargs):
+        return (0, WrapperService(Scene()))
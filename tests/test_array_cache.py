@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from plot_wrapper import ArrayCodec
+
+from _hosts import EchoHost, AsyncEchoHost
+
+
+@pytest.fixture
+def host():
+    host = EchoHost()
+    host.start(transport="unix", codec=ArrayCodec(None, cache_bytes=8 << 20, cache_threshold=1 << 10))
+    yield host
+    host.stop()
+
+
+def test_repeated_array_is_sent_as_digest(host):
+    a = np.random.rand(1 << 14)
+    for _ in range(3):
+        assert np.array_equal(host.echo(a), a)
+    assert host.array_codec.cache_hits >= 2
+
+
+def test_mixed_dumpable_tuple(host):
+    # The tuple is not dumpable as a whole, so its items are boxed one by one
+    # after the whole tuple was checked.
+    packed = np.array(list(range(5000)), dtype=object)
+    a = np.random.rand(1 << 12)
+    for _ in range(3):
+        r = host.echo((packed, a, object()))
+        assert np.array_equal(r[0], packed)
+        assert np.array_equal(r[1], a)
+        assert np.array_equal(host.first((packed, object())), packed)
+
+
+def test_eviction_keeps_both_sides_in_sync():
+    codec = ArrayCodec(None, cache_bytes=3 << 16, cache_threshold=1 << 10)
+    host = EchoHost()
+    host.start(transport="unix", codec=codec)
+    try:
+        arrays = [np.random.rand(1 << 13) for _ in range(6)]
+        for rep in range(4):
+            for a in arrays[:1] + arrays[rep:rep + 3]:
+                assert np.array_equal(host.echo(a), a)
+        assert codec.cache_hits > 0
+    finally:
+        host.stop()
+
+
+@pytest.mark.parametrize("attach_codec", [None, ArrayCodec(None)])
+def test_attach_without_cache(attach_codec):
+    host = AsyncEchoHost()
+    host.start(transport="unix", multi_client=True, codec=ArrayCodec(None, cache_bytes=8 << 20, cache_threshold=1 << 10))
+    other = AsyncEchoHost()
+    other.attach(host.address, codec=attach_codec)
+    try:
+        a = np.random.rand(1 << 14)
+        for _ in range(3):
+            assert np.array_equal(other.echo(a), a)
+            assert np.array_equal(host.echo(a), a)
+        assert host.array_codec.cache_hits >= 2
+    finally:
+        other.stop()
+        host.stop()
+
+
+def test_attach_with_cache_to_wrapper_without_one():
+    host = AsyncEchoHost()
+    host.start(transport="unix", multi_client=True)
+    other = AsyncEchoHost()
+    other.attach(host.address, codec=ArrayCodec(None, cache_bytes=8 << 20, cache_threshold=1 << 10))
+    try:
+        a = np.random.rand(1 << 14)
+        for _ in range(3):
+            assert np.array_equal(other.echo(a), a)
+        assert other.array_codec.cache_hits == 0
+    finally:
+        other.stop()
+        host.stop()
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+from rpyc.core import brine
+
+import plot_wrapper
+
+
+def round_trip(obj):
+    return brine.load(brine.dump(obj))
+
+
+@pytest.mark.parametrize("items", [
+    ["a", "bc", "", "défg"],
+    [b"a", b"", b"xyz"],
+    [1, 2, 3 << 40],
+    [1.5, 2.5],
+    [True, False],
+    [1, "a", None, (1, 2)],
+    [1 << 70, 2],
+])
+def test_object_array_round_trip(items):
+    array = np.empty(len(items), dtype=object)
+    array[:] = items
+    back = round_trip(array)
+    assert back.dtype == object
+    assert back.tolist() == items
+    assert [type(x) for x in back.tolist()] == [type(x) for x in items]
+
+
+def test_dumpable_check_has_no_side_effects():
+    array = np.array(["a", "b"], dtype=object)
+    assert brine.dumpable(array)
+    # Changing the array after the check must show up in the dump.
+    array[0] = "changed"
+    assert round_trip(array).tolist() == ["changed", "b"]
+
+
+def test_object_array_with_undumpable_element():
+    array = np.array([1, object()], dtype=object)
+    assert not brine.dumpable(array)
+    with pytest.raises(TypeError):
+        brine.dump(array)
+
+
+def test_rejected_value_keeps_type_dumpable(monkeypatch):
+    class Positive(int):
+        pass
+
+    def dumpable_positive(obj):
+        return type(obj) is Positive and obj > 0
+    monkeypatch.setattr(brine, "_custom_dumpable", brine._custom_dumpable + [dumpable_positive])
+    assert brine.dumpable(Positive(1))
+    assert not brine.dumpable(Positive(-1))
+    assert brine._custom_dumpable_cache[Positive] is dumpable_positive
+    assert brine.dumpable(Positive(2))
+
+
+@pytest.fixture(scope="module")
+def quantizing_host():
+    from _hosts import EchoHost
+    host = EchoHost()
+    host.start(transport="unix", codec=plot_wrapper.ArrayCodec(None, threshold=0, quantize_colors=True))
+    yield host
+    host.stop()
+
+
+def test_quantize_colors_leaves_unmarked_arrays_exact(quantizing_host):
+    points = np.random.default_rng(0).random((1000, 3))
+    back = quantizing_host.echo(points)
+    assert back.dtype == points.dtype
+    assert np.array_equal(back, points)
+
+
+def test_quantize_colors_quantizes_marked_colors(quantizing_host):
+    colors = np.random.default_rng(1).random((1000, 4))
+    back = quantizing_host.echo(plot_wrapper.Colors(colors))
+    assert back.dtype == colors.dtype and back.shape == colors.shape
+    assert np.abs(back - colors).max() <= 0.5 / 255 + 1e-12
+    assert np.allclose(back, np.rint(colors * 255) / 255, rtol=0, atol=1e-12)
+
+
+LAYOUTS = {
+    "fortran": lambda: np.asfortranarray(np.arange(24.0).reshape(4, 6)),
+    "strided": lambda: np.arange(100.0).reshape(10, 10)[::3, 1::2],
+    "big endian": lambda: np.arange(12, dtype=">i4").reshape(3, 4),
+    "0-d": lambda: np.array(3.5),
+    "structured": lambda: np.array([(1, 2.0), (3, 4.0)], dtype=[("a", "<i2"), ("b", "<f8")]),
+}
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_layout_round_trip(layout):
+    array = LAYOUTS[layout]()
+    back = round_trip(array)
+    assert back.dtype == array.dtype and back.shape == array.shape
+    assert np.array_equal(back, array)
+    # Loaded arrays own writable memory.
+    assert back.flags.writeable
+    back[...] = 0
+
+
+@pytest.fixture(scope="module")
+def plain_host():
+    from _hosts import EchoHost
+    host = EchoHost()
+    host.start(transport="unix")
+    yield host
+    host.stop()
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_layout_round_trip_through_host(plain_host, layout):
+    array = LAYOUTS[layout]()
+    back = plain_host.echo(array)
+    assert back.dtype == array.dtype and back.shape == array.shape
+    assert np.array_equal(back, array)
+    assert back.flags.writeable
+
+
+def test_channel_compression_is_off(plain_host):
+    assert not plain_host._ServiceHost__client._channel.compress
+    # Large enough for the channel to compress, if it still did.
+    array = np.cumsum(np.random.default_rng(0).standard_normal(1 << 13))
+    assert np.array_equal(plain_host.echo(array), array)
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from _hosts import EchoHost, RecorderHost
+
+
+@pytest.fixture(scope="module")
+def host():
+    host = EchoHost()
+    host.start(transport="unix")
+    yield host
+    host.stop()
+
+
+def test_handles_resolve_to_earlier_results(host):
+    with host.batch(keep_results=True) as batch:
+        pair = host.echo((np.arange(3), 5))
+        first = pair[0]
+        total = host.total(first)
+        # Handles nested in tuples, and attribute lookups on results.
+        nested = host.first(((pair[1], 6),))
+        count = host.echo((1, 2, 1)).count(1)
+    assert np.array_equal(batch.result(first), np.arange(3))
+    assert batch.result(total) == 3.0
+    assert batch.result(nested) == (5, 6)
+    assert batch.result(count) == 2
+
+
+def test_service_names_reach_the_wrapped_object(host):
+    # host.stats is ServiceHost.stats, record the lookup directly.
+    with host.batch(keep_results=True) as batch:
+        stats = batch.getattr("stats")()
+    assert batch.result(stats) == "wrapped stats"
+
+
+def test_results_need_keep_results(host):
+    with host.batch() as batch:
+        host.echo(1)
+    with pytest.raises(RuntimeError):
+        batch.result(0)
+
+
+def test_calls_run_in_order_in_one_request():
+    host = RecorderHost()
+    host.start(transport="unix")
+    try:
+        with host.batch():
+            for i in range(5):
+                host.record(i)
+        assert host.recorded() == (0, 1, 2, 3, 4)
+    finally:
+        host.stop()
+
+
+def test_misuse_is_reported(host):
+    with host.batch():
+        handle = host.echo((1, 2))
+        with pytest.raises(TypeError):
+            a, b = handle
+        with pytest.raises(TypeError):
+            handle.x = 1
+        with pytest.raises(RuntimeError):
+            with host.batch():
+                pass
+    with host.batch():
+        with pytest.raises(ValueError):
+            host.echo(handle)
@@ -0,0 +1,53 @@
+import pytest
+
+from _hosts import AsyncEchoHost
+
+
+def test_attached_clients_are_listed():
+    host = AsyncEchoHost()
+    host.start(transport="unix", multi_client=True)
+    other = AsyncEchoHost()
+    other.attach(host.address)
+    try:
+        assert other.echo(1) == 1
+        assert host.echo(2) == 2
+        clients = host.clients()
+        assert len(clients) == 2
+        assert sorted(client["owner"] for client in clients) == [False, True]
+        assert all(client["requests"] > 0 for client in clients)
+        # The wrapped object's own clients() is not hidden by the service call.
+        assert host._ServiceHost__client.root.clients() == "wrapped clients"
+    finally:
+        other.stop()
+        host.stop()
+
+
+@pytest.mark.parametrize("transport", ["tcp", "unix"])
+def test_attach_is_refused_by_default(transport):
+    host = AsyncEchoHost()
+    host.start(transport=transport)
+    try:
+        if transport == "tcp":
+            assert host.address[0] == "127.0.0.1"
+        # Once a request is served the owner is accepted, and the listener closed.
+        assert host.echo(3) == 3
+        other = AsyncEchoHost()
+        with pytest.raises(OSError):
+            other.attach(host.address)
+        assert len(host.clients()) == 1
+    finally:
+        host.stop()
+
+
+def test_tcp_listens_on_loopback():
+    host = AsyncEchoHost()
+    host.start(transport="tcp", multi_client=True)
+    other = AsyncEchoHost()
+    other.attach(host.address)
+    try:
+        assert other.echo(4) == 4
+        peers = [client["address"] for client in host.clients()]
+        assert all("127.0.0.1" in peer for peer in peers)
+    finally:
+        other.stop()
+        host.stop()
@@ -0,0 +1,65 @@
+import pytest
+
+pytest.importorskip("matplotlib")
+
+from plot_wrapper import FigureFarm
+
+PNG = b"\x89PNG"
+
+
+def line(fig, n):
+    fig.add_subplot().plot(range(n))
+
+
+def broken(fig, message):
+    raise ValueError(message)
+
+
+def test_map_yields_every_job():
+    with FigureFarm(workers=2) as farm:
+        results = dict(farm.map(line, ((n,) for n in range(1, 9))))
+    assert sorted(results) == list(range(8))
+    assert all(png.startswith(PNG) for png in results.values())
+
+
+def test_one_worker_finishes_jobs_in_order():
+    with FigureFarm(workers=1) as farm:
+        # max_pending is 4 per worker.
+        ids = [farm.submit(line, n) for n in range(1, 5)]
+        assert [job_id for job_id, _ in farm.as_completed()] == ids
+
+
+def test_max_pending_bounds_uncollected_results():
+    with FigureFarm(workers=1, max_pending=3) as farm:
+        for n in range(3):
+            farm.submit(line, n + 1)
+        assert farm.pending() == 3
+        # Every slot holds a finished, uncollected result: submitting more can't wait them out.
+        with pytest.raises(RuntimeError):
+            farm.submit(line, 1)
+        assert len(list(farm.as_completed())) == 3
+        farm.submit(line, 1)
+        assert len(list(farm.as_completed())) == 1
+
+
+def test_job_errors_are_raised_when_collected():
+    with FigureFarm(workers=1) as farm:
+        bad = farm.submit(broken, "no data")
+        good = farm.submit(line, 3)
+        results = farm.as_completed()
+        with pytest.raises(ValueError, match="no data"):
+            next(results)
+        # The worker keeps serving.
+        assert dict(farm.as_completed())[good].startswith(PNG)
+        assert bad != good
+
+
+def test_workers_are_recycled(tmp_path):
+    with FigureFarm(workers=1, max_jobs_per_worker=2) as farm:
+        first = farm.workers[0].host
+        paths = dict(farm.map(line, ((n,) for n in range(1, 6)), path_format=str(tmp_path / "{}.png")))
+        assert farm.workers[0].host is not first
+    assert len(paths) == 5
+    for path in paths.values():
+        with open(path, "rb") as f:
+            assert f.read(4) == PNG
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from plot_wrapper import ArrayCodec
+from plot_wrapper._brine_PIL_patch import PNG_MODES, JPEG_MODES
+
+from _hosts import EchoHost
+
+Image = pytest.importorskip("PIL.Image")
+
+MODES = sorted(PNG_MODES | JPEG_MODES | {"I", "F", "RGBX", "YCbCr"})
+
+
+def _image(mode):
+    rng = np.random.default_rng(0)
+    if mode == "I":
+        # Values past 16 bits, which PNG can't keep.
+        return Image.fromarray(rng.integers(-(1 << 20), 1 << 20, (32, 48), dtype=np.int32))
+    if mode == "I;16":
+        return Image.fromarray(rng.integers(0, 1 << 16, (32, 48), dtype=np.uint16))
+    image = Image.frombytes(mode, (48, 32), rng.integers(0, 256, 48 * 32 * 8, dtype=np.uint8).tobytes())
+    if mode == "P":
+        image.putpalette(rng.integers(0, 256, 768, dtype=np.uint8).tobytes())
+    return image
+
+
+@pytest.fixture(scope="module")
+def png_host():
+    host = EchoHost()
+    host.start(transport="unix", codec=ArrayCodec(None, image_format="png", image_threshold=0))
+    yield host
+    host.stop()
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_png_round_trip_keeps_mode_and_pixels(png_host, mode):
+    image = _image(mode)
+    back = png_host.echo(image)
+    assert back.mode == image.mode
+    assert back.size == image.size
+    assert back.tobytes() == image.tobytes()
+    if mode == "P":
+        assert back.getpalette() == image.getpalette()
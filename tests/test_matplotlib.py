@@ -0,0 +1,160 @@
+from collections import deque
+
+import numpy as np
+import pytest
+
+from plot_wrapper._matplotlib import _Series
+
+
+def _check(series, expected):
+    x, y = series.data()
+    assert list(x) == [sample[0] for sample in expected]
+    assert list(y) == [sample[1] for sample in expected]
+
+
+@pytest.mark.parametrize("capacity", [1, 4, 7])
+def test_series_keeps_the_last_samples_in_order(capacity):
+    rng = np.random.default_rng(capacity)
+    series = _Series(None, capacity)
+    expected = deque(maxlen=capacity)
+    t = 0
+    # Chunks smaller than, equal to and larger than the capacity, and empty ones.
+    for n in rng.integers(0, 2 * capacity + 2, 60):
+        x = np.arange(t, t + n, dtype=float)
+        y = rng.standard_normal(n)
+        series.append(x, y)
+        expected.extend(zip(x, y))
+        t += n
+        _check(series, expected)
+
+
+def test_series_data_is_contiguous():
+    series = _Series(None, 5)
+    for i in range(13):
+        series.append(np.array([float(i)]), np.array([float(-i)]))
+    x, y = series.data()
+    assert x.flags.c_contiguous and y.flags.c_contiguous
+    assert list(x) == [8.0, 9.0, 10.0, 11.0, 12.0]
+    # Views of the buffer, not copies.
+    assert np.shares_memory(x, series.x)
+
+
+def test_empty_series():
+    series = _Series(None, 3)
+    x, y = series.data()
+    assert len(x) == 0 and len(y) == 0
+    series.append(np.empty(0), np.empty(0))
+    assert len(series.data()[0]) == 0
+
+
+class _Recording:
+    """Counts what a Blitter asks an Agg canvas to do."""
+
+    def __init__(self, canvas):
+        self.full = 0
+        self.restored = []
+        self.blitted = []
+        draw, restore = canvas.draw, canvas.restore_region
+
+        def counted_draw(*args, **kwargs):
+            self.full += 1
+            return draw(*args, **kwargs)
+
+        def counted_restore(region, *args, **kwargs):
+            self.restored.append(region)
+            return restore(region, *args, **kwargs)
+        canvas.draw = counted_draw
+        canvas.restore_region = counted_restore
+        canvas.blit = lambda bbox=None: self.blitted.append(bbox)
+
+    def clear(self):
+        self.full = 0
+        self.restored.clear()
+        self.blitted.clear()
+
+
+@pytest.fixture
+def blit_figure():
+    pytest.importorskip("matplotlib")
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from plot_wrapper._matplotlib import Blitter
+
+    fig = Figure()
+    canvas = FigureCanvasAgg(fig)
+    axes = fig.subplots(1, 2)
+    lines = [ax.plot(np.arange(10.0), animated=True)[0] for ax in axes]
+    recording = _Recording(canvas)
+    blitter = Blitter()
+    blitter.draw(canvas)
+    return blitter, canvas, axes, lines, recording
+
+
+def test_first_frame_is_a_full_draw(blit_figure):
+    blitter, canvas, axes, lines, recording = blit_figure
+    assert recording.full == 1
+    assert recording.restored == []
+    assert recording.blitted == [ax.bbox for ax in axes]
+
+
+def test_unchanged_frame_draws_nothing(blit_figure):
+    blitter, canvas, axes, lines, recording = blit_figure
+    recording.clear()
+    blitter.draw(canvas)
+    assert recording.full == 0 and recording.blitted == []
+
+
+def test_animated_change_blits_only_its_axes(blit_figure):
+    blitter, canvas, axes, lines, recording = blit_figure
+    recording.clear()
+    lines[1].set_ydata(np.arange(10.0)[::-1])
+    assert not canvas.figure.stale
+    blitter.draw(canvas)
+    assert recording.full == 0
+    assert len(recording.restored) == 1
+    assert recording.blitted == [axes[1].bbox]
+
+
+def test_other_changes_draw_the_full_figure(blit_figure):
+    blitter, canvas, axes, lines, recording = blit_figure
+    recording.clear()
+    axes[0].set_xlim(0, 20)
+    blitter.draw(canvas)
+    assert recording.full == 1 and recording.restored == []
+    recording.clear()
+    canvas.figure.set_size_inches(3, 2)
+    blitter.draw(canvas)
+    assert recording.full == 1
+
+
+def test_backend_redraw_invalidates_backgrounds(blit_figure):
+    blitter, canvas, axes, lines, recording = blit_figure
+    # Drawn outside the blitter, like a window being exposed.
+    canvas.draw()
+    recording.clear()
+    blitter.draw(canvas)
+    assert recording.full == 1
+
+
+def test_canvas_without_blit_draws_full_frames(capsys):
+    pytest.importorskip("matplotlib")
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from plot_wrapper._matplotlib import Blitter
+
+    class NoBlitCanvas(FigureCanvasAgg):
+        supports_blit = False
+
+    fig = Figure()
+    canvas = NoBlitCanvas(fig)
+    line, = fig.subplots().plot(np.arange(10.0), animated=True)
+    recording = _Recording(canvas)
+    blitter = Blitter()
+    blitter.draw(canvas)
+    blitter.draw(canvas)
+    assert not line.get_animated()
+    assert recording.full == 1 and recording.blitted == []
+    line.set_ydata(np.zeros(10))
+    blitter.draw(canvas)
+    assert recording.full == 2
+    assert capsys.readouterr().out.count("can't blit") == 1
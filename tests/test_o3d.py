@@ -0,0 +1,42 @@
+from plot_wrapper._o3d import GeometryRegistry
+
+
+class FakeVisualizer:
+    def __init__(self):
+        self.geometries = []
+
+    def add_geometry(self, geometry, reset_bounding_box=True):
+        self.geometries.append(geometry)
+        return True
+
+    def remove_geometry(self, geometry, reset_bounding_box=True):
+        if geometry not in self.geometries:
+            return False
+        self.geometries.remove(geometry)
+        return True
+
+    def clear_geometries(self):
+        self.geometries.clear()
+        return True
+
+
+def test_remove_geometry_by_handle():
+    registry = GeometryRegistry(FakeVisualizer())
+    first, second = object(), object()
+    handle = registry.add_geometry(first)
+    registry.add_geometry(second)
+    assert handle
+    assert registry.remove_geometry(handle)
+    assert registry.vis.geometries == [second]
+    assert handle not in registry.geometries
+
+
+def test_remove_geometry_by_geometry():
+    # The signature of Visualizer.remove_geometry keeps working.
+    registry = GeometryRegistry(FakeVisualizer())
+    geometry = object()
+    registry.add_geometry(geometry)
+    assert registry.remove_geometry(geometry, reset_bounding_box=False)
+    assert registry.vis.geometries == []
+    assert registry.geometries == {}
+    assert not registry.remove_geometry(object())
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from plot_wrapper import ArrayCodec, WarmPool
+
+from _hosts import EchoHost, RecorderHost, BadPreloadHost
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with WarmPool(EchoHost, size=1, start_options={"stats": True}) as pool:
+        yield pool
+
+
+def _start(host, pool, **options):
+    host.start(transport="unix", pool=pool, **options)
+    try:
+        return host._ServiceHost__worker is not None
+    finally:
+        host.stop()
+
+
+def test_matching_start_uses_the_pool(pool):
+    assert _start(EchoHost(), pool, stats=True)
+
+
+def test_other_options_start_a_fresh_process(pool):
+    assert not _start(EchoHost(), pool)
+    assert not _start(EchoHost(), pool, stats=True, codec=ArrayCodec())
+    assert not _start(EchoHost(), pool, stats=True, spinrate=10)
+
+
+def test_other_host_type_starts_its_own_service(pool):
+    host = RecorderHost()
+    host.start(transport="unix", pool=pool, stats=True)
+    try:
+        assert host._ServiceHost__worker is None
+        host.record(1)
+        assert host.recorded() == (1,)
+    finally:
+        host.stop()
+
+
+def test_pool_with_codec():
+    codec = ArrayCodec(None, cache_bytes=1 << 20)
+    with WarmPool(EchoHost, size=1, start_options={"codec": codec}) as pool:
+        host = EchoHost()
+        host.start(transport="unix", pool=pool, codec=codec)
+        try:
+            assert host._ServiceHost__worker is not None
+            a = np.random.rand(1 << 14)
+            assert np.array_equal(host.echo(a), a)
+        finally:
+            host.stop()
+
+
+def test_checkout_does_not_fork():
+    with WarmPool(EchoHost, size=1) as pool:
+        pid = pool.idle[0].proc.pid
+        host = EchoHost()
+        host.start(transport="unix", pool=pool)
+        try:
+            assert host._ServiceHost__server_proc.pid == pid
+            assert pool.idle == []
+        finally:
+            host.stop()
+        # The worker came back, nothing else was spawned.
+        assert [worker.proc.pid for worker in pool.idle] == [pid]
+
+
+def test_failed_preload_starts_a_fresh_process():
+    with WarmPool(BadPreloadHost, size=1) as pool:
+        for _ in range(2):
+            host = BadPreloadHost()
+            host.start(transport="unix", pool=pool)
+            try:
+                assert host._ServiceHost__worker is None
+                assert host.echo(1) == 1
+            finally:
+                host.stop()
+        assert "preload failed" in pool.preload_error
+        # Not respawned.
+        assert pool.idle == []
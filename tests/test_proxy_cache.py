@@ -0,0 +1,71 @@
+from _hosts import SceneHost
+
+
+def _start(host, **options):
+    host.start(transport="unix", **options)
+    return host
+
+
+def test_references_are_cached_until_invalidated():
+    host = _start(SceneHost())
+    try:
+        assert host.retarget is host.retarget
+        assert host.target.get_name() == "first"
+        host.retarget("second")
+        # Still the object looked up before the wrapper rebound it.
+        assert host.target.get_name() == "first"
+        host.invalidate("target")
+        assert host.target.get_name() == "second"
+        host.retarget("third")
+        host.invalidate()
+        assert host.target.get_name() == "third"
+    finally:
+        host.stop()
+
+
+def test_values_are_never_cached():
+    host = _start(SceneHost())
+    try:
+        assert host.count == 0
+        host.retarget("second")
+        assert host.count == 1
+    finally:
+        host.stop()
+
+
+def test_uncached_attributes():
+    class Host(SceneHost):
+        uncached_attributes = frozenset({"target"})
+
+    host = _start(Host())
+    try:
+        assert host.target.get_name() == "first"
+        host.retarget("second")
+        assert host.target.get_name() == "second"
+        assert host.retarget is host.retarget
+    finally:
+        host.stop()
+
+
+def test_cache_can_be_turned_off():
+    host = _start(SceneHost(), cache_attributes=False)
+    try:
+        assert host.target.get_name() == "first"
+        host.retarget("second")
+        assert host.target.get_name() == "second"
+        # A fresh netref every lookup.
+        assert host.retarget is not host.retarget
+    finally:
+        host.stop()
+
+
+def test_restart_forgets_cached_references():
+    host = _start(SceneHost())
+    host.retarget("second")
+    assert host.target.get_name() == "second"
+    host.stop()
+    _start(host)
+    try:
+        assert host.target.get_name() == "first"
+    finally:
+        host.stop()
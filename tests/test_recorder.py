@@ -0,0 +1,41 @@
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+from _hosts import AsyncEchoHost
+
+
+def test_recording_writes_captured_frames(tmp_path):
+    host = AsyncEchoHost()
+    host.start(transport="unix", spinrate=50)
+    try:
+        pattern = os.path.join(tmp_path, "{:04d}.npy")
+        host.start_recording(pattern, fps=20)
+        time.sleep(0.5)
+        written, skipped = host.stop_recording()
+        assert host.stop_recording() is None
+    finally:
+        host.stop()
+    files = sorted(glob.glob(os.path.join(tmp_path, "*.npy")))
+    assert written > 0 and len(files) == written
+    assert np.load(files[0]).shape == (8, 12, 3)
+
+
+def test_recording_with_command_list(tmp_path):
+    out = os.path.join(tmp_path, "frames.raw")
+    # Copies the raw frames from stdin, stands in for an encoder.
+    command = [sys.executable, "-c", "import shutil, sys; shutil.copyfileobj(sys.stdin.buffer, open(sys.argv[1], 'wb'))",
+               "{path}"]
+    host = AsyncEchoHost()
+    host.start(transport="unix", spinrate=50)
+    try:
+        host.start_recording(out, fps=20, command=command)
+        time.sleep(0.5)
+        written, skipped = host.stop_recording()
+    finally:
+        host.stop()
+    assert written > 0
+    assert os.path.getsize(out) == written * 8 * 12 * 3
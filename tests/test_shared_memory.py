@@ -0,0 +1,84 @@
+import glob
+import os
+
+import numpy as np
+
+from _hosts import EchoHost, AsyncEchoHost
+
+
+def segments(pid):
+    return glob.glob(f"/dev/shm/plot_wrapper_{pid}_*")
+
+
+def test_segment_is_reused():
+    host = EchoHost()
+    host.start(transport="unix", shared_memory=True, shm_threshold=1 << 16)
+    try:
+        child = host._ServiceHost__server_proc.pid
+        a = np.random.rand(1 << 15)
+        for _ in range(4):
+            assert np.array_equal(host.echo(a), a)
+        # One segment each way, used for every call.
+        assert len(segments(os.getpid())) == 1
+        assert len(segments(child)) == 1
+    finally:
+        host.stop()
+
+
+def test_falls_back_to_socket():
+    host = EchoHost()
+    host.start(transport="unix", shared_memory=True, shm_threshold=1 << 16, shm_max_segments=1)
+    try:
+        a, b = np.random.rand(1 << 14), np.random.rand(1 << 15)
+        # The only segment holds a, b goes over the socket.
+        back = host.echo((a, b))
+        assert np.array_equal(back[0], a) and np.array_equal(back[1], b)
+        # Under the threshold, no segment.
+        small = np.random.rand(16)
+        assert np.array_equal(host.echo(small), small)
+        assert len(segments(os.getpid())) == 1
+    finally:
+        host.stop()
+
+
+def test_segments_are_unlinked_on_stop():
+    host = EchoHost()
+    host.start(transport="unix", shared_memory=True, shm_threshold=1 << 16)
+    child = host._ServiceHost__server_proc.pid
+    a = np.random.rand(1 << 15)
+    assert np.array_equal(host.echo(a), a)
+    host.stop()
+    assert segments(os.getpid()) == []
+    assert segments(child) == []
+
+
+def test_host_without_shared_memory_sends_over_socket():
+    first = EchoHost()
+    first.start(transport="unix", shared_memory=True, shm_threshold=1 << 16)
+    second = EchoHost()
+    second.start(transport="unix")
+    try:
+        # Over the default threshold too.
+        a = np.random.rand(1 << 18)
+        assert np.array_equal(first.echo(a), a)
+        before = segments(os.getpid())
+        assert np.array_equal(second.echo(a), a)
+        assert segments(os.getpid()) == before
+        assert segments(second._ServiceHost__server_proc.pid) == []
+    finally:
+        second.stop()
+        first.stop()
+
+
+def test_attached_client_gets_arrays_over_socket():
+    host = AsyncEchoHost()
+    host.start(transport="unix", multi_client=True, shared_memory=True, shm_threshold=1 << 16)
+    other = AsyncEchoHost()
+    other.attach(host.address)
+    try:
+        a = np.random.rand(1 << 15)
+        assert np.array_equal(other.echo(a), a)
+        assert np.array_equal(host.echo(a), a)
+    finally:
+        other.stop()
+        host.stop()
@@ -0,0 +1,15 @@
+import time
+
+from _hosts import AsyncEchoHost
+
+
+def test_frame_rate_follows_spinrate():
+    host = AsyncEchoHost()
+    host.start(transport="unix", spinrate=50)
+    try:
+        time.sleep(1.2)
+        rate, frames = host.frame_rate()
+        assert frames > 0
+        assert 25 < rate < 75
+    finally:
+        host.stop()
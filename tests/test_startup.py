@@ -0,0 +1,35 @@
+import pytest
+
+from _hosts import EchoHost
+
+
+@pytest.mark.parametrize("args, kwargs", [((0.01,), {}), ((), {"sleep_dt": 0.5})])
+def test_start_accepts_sleep_dt(args, kwargs, capsys):
+    host = EchoHost()
+    host.start(*args, transport="unix", **kwargs)
+    try:
+        assert host.echo(3) == 3
+    finally:
+        host.stop()
+    assert "deprecated" in capsys.readouterr().out
+
+
+def test_start_reports_child_errors():
+    class FailingHost(EchoHost):
+        def create_wrapper_service(self, **kwargs):
+            raise ValueError("no display")
+
+    with pytest.raises(RuntimeError, match="no display"):
+        FailingHost().start(transport="unix")
+
+
+def test_tcp_connection_disables_nagle():
+    import socket
+    host = EchoHost()
+    host.start(transport="tcp")
+    try:
+        sock = host._ServiceHost__client._channel.stream.sock
+        assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        assert host.echo(3) == 3
+    finally:
+        host.stop()
@@ -0,0 +1,35 @@
+import numpy as np
+
+from plot_wrapper import _stats
+
+from _hosts import EchoHost
+
+
+def test_stats_do_not_hide_wrapped_attributes():
+    host = EchoHost()
+    host.start(transport="unix", stats=True)
+    try:
+        host.echo(np.arange(10))
+        stats = host.stats()
+        assert set(stats) == {"parent", "child"}
+        # Other clients of the wrapper, and batches, look names up on the wrapper service.
+        assert host._ServiceHost__client.root.stats() == "wrapped stats"
+        host.enable_stats(False)
+    finally:
+        host.stop()
+
+
+def test_stop_disables_parent_stats():
+    first, second = EchoHost(), EchoHost()
+    first.start(transport="unix", stats=True)
+    second.start(transport="unix", stats=True)
+    try:
+        assert _stats.enabled
+        first.stop()
+        # Still recorded for the other host.
+        assert _stats.enabled
+        second.echo(1)
+        assert second.stats()["parent"]["enabled"]
+    finally:
+        second.stop()
+    assert not _stats.enabled
@@ -0,0 +1,75 @@
+import sys
+
+import numpy as np
+import pytest
+from rpyc.core import brine
+
+import plot_wrapper
+from plot_wrapper._brine_array_patch import _dump_array
+from plot_wrapper._brine_patch import LOADER_IDS
+
+
+def _tensor_stream(dtype_name, data):
+    from plot_wrapper._brine_tensor_patch import TENSOR_DTYPE_CODES, QSCHEME_NONE
+    stream = [brine.TAG_CUSTOM]
+    brine._dump_int(LOADER_IDS[("_brine_tensor_patch", "_load_tensor")], stream)
+    brine._dump_int(TENSOR_DTYPE_CODES[dtype_name], stream)
+    brine._dump_int(QSCHEME_NONE, stream)
+    _dump_array(data, stream)
+    return b"".join(stream)
+
+
+def test_numpy_receiver_does_not_load_torch_patch():
+    if "torch" in sys.modules:
+        pytest.skip("torch already imported")
+    data = np.arange(6, dtype=np.float32).reshape(2, 3)
+    assert np.array_equal(brine.load(_tensor_stream("float32", data)), data)
+    assert "plot_wrapper._brine_torch_patch" not in sys.modules
+    assert "torch" not in sys.modules
+
+
+@pytest.mark.parametrize("shape", [(), (5,), (3, 4)])
+def test_complex32_loads_as_complex64(shape):
+    expected = (np.arange(np.prod(shape, dtype=int)) + 1j * np.arange(np.prod(shape, dtype=int))[::-1])
+    expected = expected.astype(np.complex64).reshape(shape)
+    # What _brine_torch_patch sends for a complex32 tensor: view_as_real as float16.
+    pairs = np.stack([expected.real, expected.imag], axis=-1).astype(np.float16)
+    loaded = brine.load(_tensor_stream("complex32", pairs))
+    assert loaded.dtype == np.complex64
+    assert loaded.shape == shape
+    assert np.array_equal(loaded, expected)
+
+
+@pytest.mark.parametrize("format", ["numpy", "torch"])
+def test_complex32_round_trip(format):
+    torch = pytest.importorskip("torch")
+    from plot_wrapper import _brine_array_patch
+    tensor = torch.complex(torch.arange(12.0), -torch.arange(12.0)).reshape(3, 4).to(torch.complex32)
+    previous = _brine_array_patch.tensor_format
+    plot_wrapper.set_tensor_format(format)
+    try:
+        loaded = brine.load(brine.dump(tensor))
+    finally:
+        _brine_array_patch.tensor_format = previous
+    if format == "torch":
+        assert loaded.dtype == torch.complex32 and loaded.shape == tensor.shape
+        assert torch.equal(torch.view_as_real(loaded), torch.view_as_real(tensor))
+    else:
+        assert loaded.shape == (3, 4)
+        assert np.array_equal(loaded, tensor.to(torch.complex64).numpy())
+
+
+def test_sparse_tensor_does_not_make_dense_ones_undumpable():
+    torch = pytest.importorskip("torch")
+    dense = torch.arange(6.0).reshape(2, 3)
+    assert not brine.dumpable(dense.to_sparse())
+    assert brine.dumpable(dense)
+    assert torch.equal(torch.as_tensor(brine.load(brine.dump(dense))), dense)
+
+
+def test_tensors_without_plain_memory_are_not_dumpable():
+    torch = pytest.importorskip("torch")
+    dense = torch.arange(6.0).reshape(2, 3)
+    assert not brine.dumpable(dense.to_sparse_csr())
+    assert not brine.dumpable(torch.empty(2, 3, device="meta"))
+    assert brine.dumpable(dense)
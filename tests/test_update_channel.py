@@ -0,0 +1,43 @@
+import time
+
+import pytest
+
+from _hosts import RecorderHost
+
+
+@pytest.fixture
+def host():
+    host = RecorderHost()
+    host.start(transport="unix")
+    yield host
+    host.stop()
+
+
+@pytest.mark.parametrize("policy", ["latest", "drop_oldest"])
+def test_pending_frame_is_sent_when_the_window_frees(host, policy):
+    channel = host.update_channel(window=1, policy=policy)
+    with channel.frame(key="a"):
+        host.record("first", 0.2)
+    with channel.frame(key="b"):
+        host.record("second")
+    assert len(channel.pending) == 1
+    time.sleep(0.3)
+    # Any call through the host serves the reply of the first frame, which sends the second one.
+    host.recorded()
+    assert len(channel.pending) == 0
+    assert host.recorded() == ("first", "second")
+    channel.flush()
+    assert channel.sent == 2 and channel.dropped == 0
+
+
+def test_failed_frame_raises_outside_callbacks(host):
+    channel = host.update_channel(window=1)
+    with channel.frame():
+        # Missing argument, fails on the wrapper.
+        host.record()
+    # The reply is served inside this call, the completion callback must not raise it here.
+    host.recorded()
+    with pytest.raises(TypeError):
+        with channel.frame():
+            host.record("after")
+        channel.flush()